@@ -1,36 +1,58 @@
-import random
+import numpy as np
 import torch
-from typing import List
+from typing import Optional
 
 
 class ExperienceMemory:
     """
     A simple circular buffer for storing experience transitions.
+    Transitions are stored as rows of a single preallocated 2-D tensor.
     Uses a potentially custom replacement strategy.
     """
 
-    def __init__(self, capacity: int = 10000):
+    def __init__(
+        self,
+        capacity: int = 10000,
+        feature_dim: int = 23,
+        pin_memory: bool = False,
+        storage_dtype: torch.dtype = torch.float32,
+    ):
         """
         Initializes the ExperienceMemory.
 
         Args:
             capacity: The maximum number of transitions to store.
+            feature_dim: The number of elements in a single transition,
+                         i.e. state(N) + action(1) + reward(1) + next_state(N) + terminal(1).
+            pin_memory: Whether to keep the buffer and sampled batches in page-locked
+                        host memory, so batches can be copied to CUDA asynchronously.
+            storage_dtype: The dtype used to store transitions (e.g. torch.bfloat16 to
+                           halve the footprint). Batches are always returned as float32.
         """
         if capacity <= 0:
             raise ValueError("Capacity must be positive")
+        if feature_dim < 3 or (feature_dim - 3) % 2 != 0:
+            raise ValueError(
+                f"Invalid feature_dim {feature_dim}. Expected 2 * state_dims + 3."
+            )
         self.capacity = capacity
-        self.memory: List[torch.Tensor] = []
+        self.feature_dim = feature_dim
+        self.pin_memory = pin_memory and torch.cuda.is_available()
+        self.buffer = torch.empty(
+            (capacity, feature_dim), dtype=storage_dtype, pin_memory=self.pin_memory
+        )
+        # NumPy view of the same storage for record_raw; NumPy has no bfloat16.
+        self._buffer_np = (
+            self.buffer.numpy() if storage_dtype != torch.bfloat16 else None
+        )
+        self.terminal_flags = np.zeros(capacity, dtype=bool)
+        self.size = 0
         self.pos = 0
         # Indices derived from the packet format structure in server.py
-        # If state_dims=8, reward is index 9, terminal is index 18
-        # state(8) + action(1) + reward(1) + next_state(8) + terminal(1) = 19 elements
-        # Index 9 = reward | Index 18 = terminal
-        # Original code used index 9 for check. Let's assume state_dims=8 implicitly here.
-        # TODO: Make indices dependent on state_dims passed to server?
-        self._reward_idx = 10 + 1  # Assumes action is 1 element
-        self._terminal_idx = (
-            self._reward_idx + 1 + 10
-        )  # Assumes next_state is 8 elements
+        # state(N) + action(1) + reward(1) + next_state(N) + terminal(1)
+        state_dims = (feature_dim - 3) // 2
+        self._reward_idx = state_dims + 1
+        self._terminal_idx = feature_dim - 1
 
     def record_transition(self, transition: torch.Tensor) -> None:
         """
@@ -51,61 +73,121 @@ class ExperienceMemory:
                 f"Unexpected transition shape: {transition.shape}. Expected (1, features) or (features,)."
             )
 
-        if self._terminal_idx >= len(transition_squeezed):
+        if len(transition_squeezed) != self.feature_dim:
+            raise IndexError(
+                f"Transition length ({len(transition_squeezed)}) does not match "
+                f"memory feature_dim ({self.feature_dim}). "
+                f"Check state_dims consistency."
+            )
+
+        is_new_terminal = bool(transition_squeezed[self._terminal_idx].item() > 0)
+
+        slot = self._next_slot()
+        self.buffer[slot].copy_(transition_squeezed)
+        self.terminal_flags[slot] = is_new_terminal
+        self.pos = (slot + 1) % self.capacity
+
+    def record_raw(self, row: np.ndarray) -> None:
+        """
+        Adds a transition given as a NumPy row with the same layout as in
+        record_transition. The row is copied straight into the buffer, without
+        going through a tensor, unless the storage dtype is bfloat16.
+
+        Args:
+            row: A 1-D array of length feature_dim (float32, as parsed by the server).
+        """
+        if row.shape != (self.feature_dim,):
             raise IndexError(
-                f"Calculated terminal index ({self._terminal_idx}) is out of bounds "
-                f"for transition length ({len(transition_squeezed)}). "
+                f"Transition shape {row.shape} does not match "
+                f"memory feature_dim ({self.feature_dim}). "
                 f"Check state_dims consistency."
             )
 
-        if len(self.memory) < self.capacity:
-            self.memory.append(transition_squeezed)
+        is_new_terminal = bool(row[self._terminal_idx] > 0)
+
+        slot = self._next_slot()
+        if self._buffer_np is not None:
+            self._buffer_np[slot] = row
         else:
-            # --- Custom Replacement Logic ---
-            # Original logic: Preferentially overwrite non-terminal states
-            # with low rewards (based on index 9, assumed to be reward).
-            # Keep terminal states with 90% probability.
-            # TODO: Verify if this custom logic is intended or if standard FIFO/random is better.
-            is_terminal = self.memory[self.pos][self._terminal_idx] > 0
-
-            # Keep terminal states with high probability, otherwise replace
-            if is_terminal and random.random() < 0.9:
-                self.pos = (self.pos + 1) % self.capacity
-                num_checked = 0
-                while (
-                    self.memory[self.pos][self._terminal_idx] > 0
-                    and random.random() < 0.9
-                ):
-                    self.pos = (self.pos + 1) % self.capacity
-                    num_checked += 1
-                    if num_checked >= self.capacity:
-                        break
-
-            self.memory[self.pos] = transition_squeezed
-            self.pos = (self.pos + 1) % self.capacity
-
-    def get_batch(self, batch_size: int = 32) -> torch.Tensor:
+            self.buffer[slot].copy_(torch.from_numpy(row))
+        self.terminal_flags[slot] = is_new_terminal
+        self.pos = (slot + 1) % self.capacity
+
+    def _next_slot(self) -> int:
         """
-        Samples a random batch of transitions from the memory.
+        Returns the index the next transition should be written to. Grows the memory
+        until it is full, then applies the replacement strategy starting at pos.
+        """
+        if self.size < self.capacity:
+            self.size += 1
+            return self.pos
+
+        # --- Custom Replacement Logic ---
+        # Original logic: Preferentially overwrite non-terminal states
+        # with low rewards (based on index 9, assumed to be reward).
+        # Keep terminal states with 90% probability.
+        # TODO: Verify if this custom logic is intended or if standard FIFO/random is better.
+        is_terminal = self.terminal_flags[self.pos]
+
+        # Keep terminal states with high probability, otherwise replace.
+        # Each terminal slot is kept with p=0.9, so the number of consecutive
+        # "keep" decisions is geometric; draw it once and land on the first
+        # non-terminal slot inside that window (or at its end).
+        if is_terminal:
+            num_kept = min(int(np.random.geometric(0.1)) - 1, self.capacity)
+            if num_kept > 0:
+                window = (self.pos + np.arange(num_kept + 1)) % self.capacity
+                non_terminal = np.flatnonzero(~self.terminal_flags[window])
+                offset = non_terminal[0] if len(non_terminal) else num_kept
+                return int(window[offset])
+
+        return self.pos
+
+    def get_batch(
+        self,
+        batch_size: int = 32,
+        device: Optional[torch.device] = None,
+        non_blocking: bool = True,
+        num_batches: int = 1,
+    ) -> torch.Tensor:
+        """
+        Samples a random batch of transitions from the memory (uniformly, with replacement).
 
         Args:
             batch_size: The number of transitions to sample.
+            device: Optional device to move the batch to before returning it.
+            non_blocking: Whether the device copy may be asynchronous (effective only
+                          when the memory is pinned and the target is a CUDA device).
+            num_batches: Number of independent batches to sample at once. They are
+                         returned stacked along the first dimension, so the result
+                         can be split into batches with `.split(batch_size)`.
 
         Returns:
-            A tensor containing the batch of transitions, shape (batch_size, features).
+            A float32 tensor containing the batches of transitions,
+            shape (num_batches * batch_size, features).
 
         Raises:
             ValueError: If batch_size is larger than the number of stored transitions.
         """
-        if batch_size > len(self.memory):
+        if batch_size > self.size:
             raise ValueError(
-                f"Requested batch size {batch_size} is larger than memory size {len(self.memory)}"
+                f"Requested batch size {batch_size} is larger than memory size {self.size}"
             )
 
-        sampled_transitions = random.sample(self.memory, batch_size)
-
-        return torch.stack(sampled_transitions)
+        idx = torch.randint(0, self.size, (num_batches * batch_size,))
+        batch = torch.empty(
+            (num_batches * batch_size, self.feature_dim),
+            dtype=self.buffer.dtype,
+            pin_memory=self.pin_memory,
+        )
+        torch.index_select(self.buffer, 0, idx, out=batch)
+
+        if device is not None or batch.dtype != torch.float32:
+            batch = batch.to(
+                device=device, dtype=torch.float32, non_blocking=non_blocking
+            )
+        return batch
 
     def __len__(self) -> int:
         """Returns the current number of transitions stored in the memory."""
-        return len(self.memory)
+        return self.size
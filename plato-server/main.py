@@ -1,62 +1,119 @@
 import argparse
 import logging
+import re
+import select
 import signal
 import sys
 import os
+import threading
 import time
+
+# The Q-network is tiny, so intra-op parallelism only adds contention. Pin the
+# OpenMP/MKL pools before torch is first imported (via server); exported values win.
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+os.environ.setdefault("MKL_NUM_THREADS", "1")
+
 from server import EnvironmentServer, WeightServer
-import torch.multiprocessing as mp
-import colorama
 import torch
 
+try:
+    NETWORKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "networks")
+except NameError:
+    NETWORKS_DIR = None
+
 
 class ColoredFormatter(logging.Formatter):
     LEVEL_COLORS = {
-        logging.DEBUG: colorama.Fore.CYAN,
-        logging.INFO: colorama.Fore.GREEN,
-        logging.WARNING: colorama.Fore.YELLOW,
-        logging.ERROR: colorama.Fore.RED,
-        logging.CRITICAL: colorama.Fore.MAGENTA + colorama.Style.BRIGHT,
+        logging.DEBUG: "\x1b[36m",
+        logging.INFO: "\x1b[32m",
+        logging.WARNING: "\x1b[33m",
+        logging.ERROR: "\x1b[31m",
+        logging.CRITICAL: "\x1b[35m\x1b[1m",
     }
-    RESET_CODE = colorama.Style.RESET_ALL
+    DEFAULT_COLOR = "\x1b[37m"
+    RESET_CODE = "\x1b[0m"
+
+    LEVELNAME_PATTERN = re.compile(r"%\(levelname\)[-#0 +]*\d*s")
 
     def __init__(self, fmt=None, datefmt=None, style="%", use_color=True):
         super().__init__(fmt, datefmt, style)
         self.use_color = use_color
+        self._level_formatters = {}
+        self._default_formatter = self
         if self.use_color:
-            colorama.init(autoreset=False)
+            if sys.platform == "win32":
+                # Only Windows consoles need colorama to translate ANSI codes.
+                import colorama
+
+                colorama.init(autoreset=False)
+            # Bake the colour codes into one formatter per level up front, so
+            # each record is formatted in a single pass.
+            self._level_formatters = {
+                levelno: logging.Formatter(
+                    self._colorize_fmt(self._fmt, color), datefmt, style
+                )
+                for levelno, color in self.LEVEL_COLORS.items()
+            }
+            self._default_formatter = logging.Formatter(
+                self._colorize_fmt(self._fmt, self.DEFAULT_COLOR), datefmt, style
+            )
+
+    def _colorize_fmt(self, fmt, color):
+        colored, count = self.LEVELNAME_PATTERN.subn(
+            lambda m: f"{color}{m.group(0)}{self.RESET_CODE}", fmt, count=1
+        )
+        return colored if count else f"{color}{fmt}{self.RESET_CODE}"
 
     def format(self, record):
-        record.message = record.getMessage()
-        if self.usesTime():
-            record.asctime = self.formatTime(record, self.datefmt)
+        formatter = self._level_formatters.get(record.levelno, self._default_formatter)
+        if formatter is self:
+            return super().format(record)
+        return formatter.format(record)
 
-        log_entry = self._fmt % record.__dict__
 
-        if self.use_color:
-            level_color = self.LEVEL_COLORS.get(record.levelno, colorama.Fore.WHITE)
-            levelname_colored = f"{level_color}{record.levelname}{self.RESET_CODE}"
+class BufferedStreamHandler(logging.StreamHandler):
+    """
+    StreamHandler that does not flush after every record. WARNING and above are
+    flushed immediately; everything else is flushed by a background thread.
+    """
 
-            try:
-                levelname_padded = f"[{record.levelname:<8s}]"
+    def __init__(self, stream=None, flush_interval=0.2):
+        super().__init__(stream)
+        self._stop_flushing = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_loop,
+            args=(flush_interval,),
+            name="LogFlusher",
+            daemon=True,
+        )
+        self._flusher.start()
 
-                levelname_colored_padded = (
-                    f"[{level_color}{record.levelname:<8s}{self.RESET_CODE}]"
-                )
-                log_entry = log_entry.replace(
-                    levelname_padded, levelname_colored_padded, 1
-                )
-            except Exception:
-                log_entry = f"{level_color}{log_entry}{self.RESET_CODE}"
-                pass
+    def emit(self, record):
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+            if record.levelno >= logging.WARNING:
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def _flush_loop(self, interval):
+        while not self._stop_flushing.wait(interval):
+            self.flush()
 
-        return log_entry
+    def close(self):
+        self._stop_flushing.set()
+        super().close()
 
 
 def setup_logging(level_str="INFO"):
     log_format = "%(asctime)s [%(process)d] [%(name)-10s] [%(levelname)-8s] %(message)s"
     date_format = "%Y-%m-%d %H:%M:%S"
-    formatter = ColoredFormatter(fmt=log_format, datefmt=date_format)
+    # Colour only interactive output; the orchestrator redirects to a log file.
+    formatter = ColoredFormatter(
+        fmt=log_format, datefmt=date_format, use_color=sys.stdout.isatty()
+    )
     log_level_map = {
         "DEBUG": logging.DEBUG,
         "INFO": logging.INFO,
@@ -65,15 +122,20 @@ def setup_logging(level_str="INFO"):
         "CRITICAL": logging.CRITICAL,
     }
     numeric_level = log_level_map.get(level_str.upper(), logging.INFO)
+    # The format only uses %(process)d, so skip the per-record thread lookups.
+    logging.logThreads = False
+    logging.logMultiprocessing = False
     root_logger = logging.getLogger()
     root_logger.setLevel(numeric_level)
-    handler = logging.StreamHandler(sys.stdout)
+    handler = BufferedStreamHandler(sys.stdout)
     handler.setFormatter(formatter)
     if root_logger.hasHandlers():
         root_logger.handlers.clear()
     root_logger.addHandler(handler)
     root_logger.info(
-        f"Logging level set to: {logging.getLevelName(numeric_level)} ({numeric_level})"
+        "Logging level set to: %s (%d)",
+        logging.getLevelName(numeric_level),
+        numeric_level,
     )
     logging.getLogger("onnxruntime").setLevel(logging.WARNING)
 
@@ -136,6 +198,13 @@ def main():
     parser.add_argument(
         "--replay-capacity", type=int, default=10000, help="Replay memory capacity."
     )
+    parser.add_argument(
+        "--replay-dtype",
+        type=str,
+        default="float32",
+        choices=["float32", "float16", "bfloat16"],
+        help="Storage dtype of the replay memory. Batches are trained in float32. Default: float32",
+    )
     parser.add_argument(
         "--save-freq", type=int, default=1000, help="Save weights every N updates."
     )
@@ -149,6 +218,35 @@ def main():
         choices=["cpu", "cuda", "auto"],
         help="Device to use for training ('cpu', 'cuda', or 'auto'). Default: auto",
     )
+    parser.add_argument(
+        "--ingest-batch",
+        type=int,
+        default=64,
+        help="Max queued UDP packets to record before training. Default: 64",
+    )
+    parser.add_argument(
+        "--update-every",
+        type=int,
+        default=1,
+        help="Run one training update per N recorded transitions. Default: 1",
+    )
+    parser.add_argument(
+        "--max-pending-updates",
+        type=int,
+        default=0,
+        help="Drop training credit beyond this many pending updates when training "
+        "falls behind (reported in TensorBoard). 0 keeps every update. Default: 0",
+    )
+    parser.add_argument(
+        "--compile-network",
+        action="store_true",
+        help="Compile the network forward pass with torch.compile.",
+    )
+    parser.add_argument(
+        "--quantize-onnx",
+        action="store_true",
+        help="Serve an int8 dynamically quantized ONNX model (training stays float32).",
+    )
     args = parser.parse_args()
 
     setup_logging(args.log_level)
@@ -163,40 +261,43 @@ def main():
         logger.warning("CUDA requested but not available. Falling back to CPU.")
         selected_device = "cpu"
 
-    logger.info(f"Using device: {selected_device}")
+    logger.info("Using device: %s", selected_device)
     device = torch.device(selected_device)
 
+    # Intra-op threads already follow OMP_NUM_THREADS; the inter-op pool does not.
     try:
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        networks_dir = os.path.join(script_dir, "networks")
-        os.makedirs(networks_dir, exist_ok=True)
-        logger.info(f"Network weights dir: {networks_dir}")
+        torch.set_num_interop_threads(1)
+    except RuntimeError as e:
+        logger.debug("Could not set inter-op threads: %s", e)
 
-        if not args.weights_file_name.endswith(".onnx"):
-            logger.warning("Weights file name does not end with .onnx. Appending it.")
-            args.weights_file_name += ".onnx"
+    if not args.weights_file_name.endswith(".onnx"):
+        logger.warning("Weights file name does not end with .onnx. Appending it.")
+        args.weights_file_name += ".onnx"
 
-        weights_file_full_path = os.path.join(networks_dir, args.weights_file_name)
+    try:
+        if NETWORKS_DIR is not None:
+            os.makedirs(NETWORKS_DIR, exist_ok=True)
+            logger.info("Network weights dir: %s", NETWORKS_DIR)
+            weights_file_full_path = os.path.join(NETWORKS_DIR, args.weights_file_name)
+        else:
+            logger.error(
+                "Cannot determine script directory (__file__ undefined). Defaulting weights path."
+            )
+            weights_file_full_path = os.path.abspath(args.weights_file_name)
         updates_file_path = weights_file_full_path + ".updates.txt"
 
-        logger.info(f"ONNX Weights file path: {weights_file_full_path}")
-        logger.info(f"Updates file path: {updates_file_path}")
+        logger.info("ONNX Weights file path: %s", weights_file_full_path)
+        logger.info("Updates file path: %s", updates_file_path)
 
         os.makedirs(args.log_dir, exist_ok=True)
-        logger.info(f"TensorBoard logs dir: {args.log_dir}")
+        logger.info("TensorBoard logs dir: %s", args.log_dir)
     except OSError as e:
-        logger.error(f"Failed to create directories: {e}", exc_info=True)
+        logger.error("Failed to create directories: %s", e, exc_info=True)
         sys.exit(1)
-    except NameError:
-        logger.error(
-            "Cannot determine script directory (__file__ undefined). Defaulting weights path."
-        )
-        weights_file_full_path = os.path.abspath(args.weights_file_name)
-        updates_file_path = weights_file_full_path + ".updates.txt"
-        os.makedirs(args.log_dir, exist_ok=True)
 
-    lock = mp.Lock()
-    shutdown_flag = mp.Event()
+    # Both servers run as threads of this process, so plain threading
+    # primitives are enough; nothing is pickled or shared across processes.
+    lock = threading.Lock()
     weight_server = None
     learning_server = None
     try:
@@ -226,47 +327,42 @@ def main():
             save_frequency=args.save_freq,
             log_dir=args.log_dir,
             device=device,
+            replay_dtype=getattr(torch, args.replay_dtype),
+            compile_network=args.compile_network,
+            quantize_onnx=args.quantize_onnx,
+            ingest_batch=args.ingest_batch,
+            update_every=args.update_every,
+            max_pending_updates=args.max_pending_updates,
         )
         learning_server.start()
     except Exception as e:
-        logger.error(f"Failed to initialize or start servers: {e}", exc_info=True)
+        logger.error("Failed to initialize or start servers: %s", e, exc_info=True)
         sys.exit(1)
 
-    def signal_handler(signum, frame):
-        logger.warning(
-            f"Received signal {signal.Signals(signum).name}. Initiating shutdown..."
-        )
-        shutdown_flag.set()
-
-        if learning_server:
-            learning_server.shutdown()
-        if weight_server:
-            weight_server.shutdown()
-
-        logger.info("Shutdown flag set. Main process will exit after cleanup.")
-        time.sleep(1)
-        sys.exit(0)
-
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
+    # Self-pipe: the interpreter writes the signal number to wakeup_w, and the
+    # main thread blocks in select() on the read end. The Python-level handlers
+    # do nothing, so shutdown never runs inside a signal frame.
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_w, False)
+    signal.set_wakeup_fd(wakeup_w)
+    signal.signal(signal.SIGINT, lambda signum, frame: None)
+    signal.signal(signal.SIGTERM, lambda signum, frame: None)
     logger.info("Servers started successfully. Press Ctrl+C to stop.")
 
-    while not shutdown_flag.is_set():
-        try:
-            time.sleep(1)
-        except KeyboardInterrupt:
-            logger.warning(
-                "KeyboardInterrupt caught directly in main loop. Forcing exit."
-            )
-            signal_handler(signal.SIGINT, None)
-            sys.exit(0)
+    received = b""
+    while not received:
+        select.select([wakeup_r], [], [])
+        received = os.read(wakeup_r, 16)
+    signal.set_wakeup_fd(-1)
+
+    logger.warning(
+        "Received signal %s. Initiating shutdown...", signal.Signals(received[0]).name
+    )
+    learning_server.shutdown()
+    weight_server.shutdown()
+    logger.info("Servers shut down. Main process will exit after cleanup.")
+    time.sleep(1)
 
 
 if __name__ == "__main__":
-    try:
-        mp.set_start_method("spawn", force=True)
-    except RuntimeError as e:
-        logging.warning(
-            f"Could not set multiprocessing start method to 'spawn': {e}. Using default."
-        )
     main()
@@ -29,10 +29,13 @@ class QNetwork(nn.Module):
         self.fc1 = nn.Linear(state_dims, hidden_dims)
         self.fc2 = nn.Linear(hidden_dims, hidden_dims)
         self.out = nn.Linear(hidden_dims, action_dims)
+        self._compiled_forward = None
 
         logging.info(
-            f"Initialized QNetwork: state_dims={state_dims}, "
-            f"action_dims={action_dims}, hidden_dims={hidden_dims}"
+            "Initialized QNetwork: state_dims=%d, action_dims=%d, hidden_dims=%d",
+            state_dims,
+            action_dims,
+            hidden_dims,
         )
 
     def forward(self, x: torch.Tensor) -> torch.Tensor:
@@ -49,3 +52,46 @@ class QNetwork(nn.Module):
         x = F.relu(self.fc2(x))
         q_values = self.out(x)
         return q_values
+
+    def compile_forward(self, mode: str = "reduce-overhead") -> bool:
+        """
+        Compiles the forward pass with torch.compile for use by fast_forward().
+
+        The module itself is left untouched, so ONNX export, graph tracing and
+        state_dict handling keep using the eager forward().
+
+        Args:
+            mode: The torch.compile mode. "reduce-overhead" uses CUDA graphs on GPU.
+
+        Returns:
+            True if a compiled forward pass was set up, False otherwise.
+        """
+        if not hasattr(torch, "compile"):
+            logging.warning("torch.compile is not available. Using eager forward.")
+            return False
+        # The forward pass is three linear layers and two ReLUs, so it must
+        # compile to a single graph; fullgraph turns any graph break into an error.
+        self._compiled_forward = torch.compile(
+            self.forward, mode=mode, dynamic=False, fullgraph=True
+        )
+        return True
+
+    def fast_forward(self, x: torch.Tensor) -> torch.Tensor:
+        """
+        Runs the compiled forward pass if one was set up, otherwise forward().
+        Falls back to eager permanently if compilation fails on first use.
+
+        Args:
+            x: The input state tensor of shape (batch_size, state_dims).
+
+        Returns:
+            A tensor of shape (batch_size, action_dims) representing Q-values for each action.
+        """
+        if self._compiled_forward is None:
+            return self(x)
+        try:
+            return self._compiled_forward(x)
+        except Exception as e:
+            logging.warning("Compiled forward failed (%s). Using eager forward.", e)
+            self._compiled_forward = None
+            return self(x)
@@ -1,3 +1,5 @@
+import copy
+import selectors
 import socketserver
 import socket
 import struct
@@ -5,15 +7,18 @@ import threading
 import time
 import os
 import logging
-from http.server import BaseHTTPRequestHandler, HTTPServer
-from typing import Dict, Any, Tuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional, Tuple
 
 import numpy as np
+import onnx
 import torch
-import torch.multiprocessing as mp
+import torch.nn as nn
 import torch.nn.functional as F
 import torch.optim as optim
 import torch.onnx
+from onnx import numpy_helper
+from onnx.external_data_helper import load_external_data_for_model
 
 from experience_memory import ExperienceMemory
 from network import QNetwork
@@ -30,6 +35,59 @@ REWARD_TYPE = "f"
 TERMINAL_TYPE = "?"
 CLIENT_ID_TYPE = ">i"
 MODEL_UPDATE_HEADER = "X-Model-Updates"
+# Requested UDP receive buffer, so bursts from many robots queue in the kernel
+# instead of being dropped while a burst is processed. Linux caps it at rmem_max.
+UDP_RECV_BUFFER_SIZE = 8 << 20
+
+
+def q_learning_step(
+    network: torch.nn.Module,
+    states: torch.Tensor,
+    actions: torch.Tensor,
+    rewards: torch.Tensor,
+    not_terminal: torch.Tensor,
+    gamma: float,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Computes the DQN loss for one minibatch.
+
+    Args:
+        network: The Q-network.
+        states: Current states followed by next states, shape (2 * batch_size, state_dims).
+            QNetwork has no dropout or normalisation layers, so one forward pass in
+            train mode gives the same next-state values as eval mode would.
+        actions: Indices of the actions taken, shape (batch_size, 1), dtype long.
+        rewards: Rewards, shape (batch_size,).
+        not_terminal: 0.0 for terminal transitions and 1.0 otherwise, shape (batch_size,).
+        gamma: The discount factor.
+
+    Returns:
+        (loss, q_values_current), where q_values_current has shape (batch_size, action_dims).
+    """
+    batch_size = actions.shape[0]
+    q_values_all = network(states)
+    q_values_current = q_values_all[:batch_size]
+    q_values_for_actions_taken = q_values_current.gather(1, actions).squeeze(1)
+
+    with torch.no_grad():
+        # amax skips the argmax indices; the masking and the discounted sum
+        # then reuse its output rather than allocating temporaries.
+        max_q_values_next = q_values_all[batch_size:].amax(dim=1).mul_(not_terminal)
+        target_q_values = torch.add(rewards, max_q_values_next, alpha=gamma)
+
+    loss = F.mse_loss(q_values_for_actions_taken, target_q_values)
+    return loss, q_values_current
+
+
+class EpisodeStats:
+    """Running totals for the current episode of one client."""
+
+    __slots__ = ("reward", "length", "q_sum")
+
+    def __init__(self) -> None:
+        self.reward = 0.0
+        self.length = 0
+        self.q_sum = 0.0
 
 
 class EnvironmentServer:
@@ -42,7 +100,7 @@ class EnvironmentServer:
         port: int,
         weights_filename: str,
         updates_filename: str,
-        lock: mp.Lock,
+        lock: threading.Lock,
         learning_rate: float = 1e-2,
         learning_rate_min: float = 1e-4,
         learning_rate_decrease: float = 1e-6,
@@ -52,6 +110,12 @@ class EnvironmentServer:
         save_frequency: int = 1000,
         log_dir: str = "/tmp/plato_logs",
         device: torch.device = torch.device("cpu"),
+        replay_dtype: torch.dtype = torch.float32,
+        compile_network: bool = False,
+        quantize_onnx: bool = False,
+        ingest_batch: int = 64,
+        update_every: int = 1,
+        max_pending_updates: int = 0,
     ):
         self.state_dims = state_dims
         self.action_dims = action_dims
@@ -63,8 +127,44 @@ class EnvironmentServer:
         self.gamma = gamma
         self.batch_size = batch_size
         self.save_frequency = save_frequency
+        # The full .pt checkpoint (with optimizer state) is only needed to resume,
+        # so it is written every tenth save, in the background.
+        self.checkpoint_frequency = save_frequency * 10
+        self._checkpoint_thread: Optional[threading.Thread] = None
+        # Batch statistics need a device->host sync, so they are only read back
+        # and sent to TensorBoard every scalar_log_every updates, averaged over
+        # the updates since the last read.
+        self.scalar_log_every = 10
+        self.ingest_batch = max(1, ingest_batch)
+        self.update_every = max(1, update_every)
+        # 0 keeps the full credit, so every update_every transitions get an update.
+        self.max_pending_updates = max(0, max_pending_updates)
+        # Transitions recorded by the UDP thread but not yet trained on. The
+        # trainer thread consumes them; both sides hold _pending_lock.
+        self._pending_transitions = 0
+        # Totals since start, so the share of transitions that earned a training
+        # update can be reported; dropped credit is the excess over the cap.
+        self._credited_transitions = 0
+        self._dropped_transitions = 0
+        self._reported_dropped_transitions = 0
+        self._pending_lock = threading.Lock()
+        self._train_event = threading.Event()
+        self._trainer_thread: Optional[threading.Thread] = None
+        # The replay memory and the network are shared by the UDP and trainer threads.
+        self._memory_lock = threading.Lock()
+        self._network_lock = threading.Lock()
         self.log_dir = log_dir
         self.device = device
+        self._batch_actions = torch.empty(
+            (batch_size, 1), dtype=torch.long, device=self.device
+        )
+        # One row per update since the last read: loss, average reward and the
+        # average Q-value of each action.
+        self._scalar_ring = torch.zeros(
+            (self.scalar_log_every, 2 + action_dims), device=self.device
+        )
+        self._scalar_ring_filled = 0
+        self.quantize_onnx = quantize_onnx
         self.shutdown_event = threading.Event()
 
         self.learning_rate = learning_rate
@@ -81,15 +181,68 @@ class EnvironmentServer:
             + TERMINAL_TYPE
         )
         self.packet_size = struct.calcsize(self.packet_format)
-        self.client_id_size = struct.calcsize(CLIENT_ID_TYPE)
-
-        self.episodes: Dict[int, Dict[str, Any]] = {}
+        # Column layout of a parsed transition row (and of replay batches):
+        # state(N) + action(1) + reward(1) + next_state(N) + terminal(1).
+        self._start_state_cols = slice(0, state_dims)
+        self._action_col = state_dims
+        self._reward_col = state_dims + 1
+        self._end_state_cols = slice(state_dims + 2, 2 * state_dims + 2)
+        self._terminal_col = 2 * state_dims + 2
+        self._client_id_struct = struct.Struct(CLIENT_ID_TYPE)
+        self.client_id_size = self._client_id_struct.size
+        # Byte offsets into the packet for frombuffer-based parsing. Reward and
+        # next_state are adjacent big-endian floats, so they are read together.
+        self._action_offset = struct.calcsize(">" + state_struct)
+        self._reward_offset = self._action_offset + struct.calcsize(ACTION_TYPE)
+        self._terminal_offset = self.packet_size - struct.calcsize(TERMINAL_TYPE)
+
+        self.episodes: Dict[int, EpisodeStats] = {}
+        # Next states whose Q estimate is still to be computed, one row per entry
+        # of _pending_q_clients. At most one ingest burst is pending at a time.
+        self._pending_q_clients: List[int] = []
+        self._pending_q_states = np.zeros(
+            (self.ingest_batch, state_dims), dtype=np.float32
+        )
+        # Parsed packets are decoded into this row, which record_transition copies.
+        self._transition_row = np.empty(2 * state_dims + 3, dtype=np.float32)
         self.writer = TensorBoardWriter(self.log_dir)
         self.updates_counter = 0
+        # The float ONNX graph from the first export; later saves only refill
+        # its initializers, since the network layout never changes.
+        self._onnx_template: Optional[onnx.ModelProto] = None
+        # Only the shape of the export input matters, so one tensor serves every export.
+        self._onnx_dummy_input = torch.zeros(1, state_dims, device=self.device)
 
         self.network = QNetwork(state_dims, action_dims, hidden_dims).to(self.device)
-        self.optimizer = optim.Adam(self.network.parameters(), lr=self.learning_rate)
-        self.memory = ExperienceMemory(capacity=replay_capacity)
+        # train()/eval() walk the whole module tree but only change the output
+        # of dropout and batch norm layers, so they are skipped on hot paths
+        # unless the network has any.
+        self._has_mode_dependent_layers = any(
+            isinstance(m, (nn.Dropout, nn.BatchNorm1d)) for m in self.network.modules()
+        )
+        self._q_step = q_learning_step
+        if compile_network and self.network.compile_forward():
+            # The forward pass and loss of a training step compile as one graph;
+            # the batch size is fixed, so it is compiled for static shapes.
+            self._q_step = torch.compile(
+                q_learning_step, mode="reduce-overhead", dynamic=False
+            )
+            env_server_logger.info(
+                "Network forward pass and training step will be compiled on first use."
+            )
+        self._params = list(self.network.parameters())
+        self.optimizer = optim.Adam(self._params, lr=self.learning_rate)
+        self.memory = ExperienceMemory(
+            capacity=replay_capacity,
+            feature_dim=(2 * state_dims) + 3,
+            pin_memory=self.device.type == "cuda",
+            storage_dtype=replay_dtype,
+        )
+        # Sampled batches are copied to the GPU on a side stream, so the copy
+        # does not queue behind the kernels of the previous update.
+        self._copy_stream = (
+            torch.cuda.Stream(self.device) if self.device.type == "cuda" else None
+        )
 
         self._initialize_network_state()
         self._add_graph_to_tensorboard()
@@ -97,7 +250,10 @@ class EnvironmentServer:
         env_server_logger.info(
             f"Initialized on {self.device}: state={state_dims}, action={action_dims}, hidden={hidden_dims}, "
             f"bs={batch_size}, gamma={gamma:.2f}, lr={self.learning_rate:.1e} (min={self.learning_rate_min:.1e}, dec={self.learning_rate_decrease:.1e}), "
-            f"replay={replay_capacity}, save_freq={save_frequency}"
+            f"replay={replay_capacity} ({replay_dtype}), save_freq={save_frequency}, "
+            f"ingest_batch={self.ingest_batch}, update_every={self.update_every}, "
+            f"max_pending_updates={self.max_pending_updates}, "
+            f"onnx={'int8' if quantize_onnx else 'float32'}"
         )
         env_server_logger.info(f"ONNX weights file: {self.onnx_weights_filename}")
         env_server_logger.info(f"Updates file: {self.updates_filename}")
@@ -202,6 +358,7 @@ class EnvironmentServer:
                 env_server_logger.info("Performing initial network state save...")
                 self.updates_counter = 0
                 self._save_network_internal()
+                self._save_checkpoint(wait=True)
                 env_server_logger.info(
                     "Initial network state (0 updates) saved successfully."
                 )
@@ -215,58 +372,56 @@ class EnvironmentServer:
             env_server_logger.debug("Releasing lock after initial state setup.")
             self.lock.release()
 
-    def _save_network_internal(self) -> None:
-        """Internal method containing the actual saving logic. Assumes lock is held."""
+    def _save_network_internal(
+        self, publish_lock: Optional[threading.Lock] = None
+    ) -> None:
+        """
+        Saves the served ONNX model and the updates file. Both are written to
+        temporary files first and then swapped in together.
+
+        Args:
+            publish_lock: Lock to take only around the swap, so weight requests are
+                          not blocked while the model is serialized. None if the
+                          caller already holds the lock.
+        """
         onnx_temp_filename = self.onnx_weights_filename + ".tmp"
+        onnx_quant_temp_filename = onnx_temp_filename + ".int8"
         updates_temp_filename = self.updates_filename + ".tmp"
-        pytorch_checkpoint_file = self.onnx_weights_filename.replace(".onnx", ".pt")
-        pytorch_temp_filename = pytorch_checkpoint_file + ".tmp"
 
         try:
             os.makedirs(os.path.dirname(self.onnx_weights_filename), exist_ok=True)
 
-            self.network.to(self.device)
-            dummy_input = torch.randn(1, self.state_dims, device=self.device)
-
-            was_training = self.network.training
-            self.network.eval()
+            if self._onnx_template is not None:
+                self._write_onnx_from_template(onnx_temp_filename)
+            else:
+                self._export_onnx(onnx_temp_filename)
 
-            torch.onnx.export(
-                self.network,
-                dummy_input,
-                onnx_temp_filename,
-                export_params=True,
-                opset_version=11,
-                do_constant_folding=True,
-                input_names=["input"],
-                output_names=["output"],
-                dynamic_axes={
-                    "input": {0: "batch_size"},
-                    "output": {0: "batch_size"},
-                },
-            )
+            if self.quantize_onnx:
+                # Only the served model is quantized; training and the .pt
+                # checkpoint stay in float32.
+                from onnxruntime.quantization import QuantType, quantize_dynamic
 
-            if was_training:
-                self.network.train()
+                quantize_dynamic(
+                    onnx_temp_filename,
+                    onnx_quant_temp_filename,
+                    weight_type=QuantType.QInt8,
+                )
+                os.replace(onnx_quant_temp_filename, onnx_temp_filename)
 
             with open(updates_temp_filename, "w") as f:
                 f.write(str(self.updates_counter))
 
-            torch.save(
-                {
-                    "updates": self.updates_counter,
-                    "model_state_dict": self.network.state_dict(),
-                    "optimizer_state_dict": self.optimizer.state_dict(),
-                },
-                pytorch_temp_filename,
-            )
-
-            os.replace(onnx_temp_filename, self.onnx_weights_filename)
-            os.replace(updates_temp_filename, self.updates_filename)
-            os.replace(pytorch_temp_filename, pytorch_checkpoint_file)
+            if publish_lock is not None and not publish_lock.acquire(timeout=10):
+                raise TimeoutError("Timeout acquiring lock to publish saved weights")
+            try:
+                os.replace(onnx_temp_filename, self.onnx_weights_filename)
+                os.replace(updates_temp_filename, self.updates_filename)
+            finally:
+                if publish_lock is not None:
+                    publish_lock.release()
 
             env_server_logger.info(
-                f"Saved state ({self.updates_counter} updates): ONNX, Updates file, PyTorch checkpoint."
+                f"Saved state ({self.updates_counter} updates): ONNX, Updates file."
             )
 
         except Exception as e:
@@ -275,8 +430,9 @@ class EnvironmentServer:
             )
             for temp_file in [
                 onnx_temp_filename,
+                onnx_temp_filename + ".data",
+                onnx_quant_temp_filename,
                 updates_temp_filename,
-                pytorch_temp_filename,
             ]:
                 if os.path.exists(temp_file):
                     try:
@@ -288,25 +444,134 @@ class EnvironmentServer:
                         )
             raise
 
-    def _save_network(self) -> None:
-        """Public method to save the network state, acquiring the lock."""
-        env_server_logger.debug(
-            f"Acquiring lock to save network state (Update #{self.updates_counter})"
+    def _export_onnx(self, filename: str) -> None:
+        """Traces the network to ONNX and keeps the result as the template for later saves."""
+        self.network.to(self.device)
+
+        was_training = self.network.training
+        self.network.eval()
+
+        torch.onnx.export(
+            self.network,
+            self._onnx_dummy_input,
+            filename,
+            export_params=True,
+            opset_version=11,
+            do_constant_folding=True,
+            input_names=["input"],
+            output_names=["output"],
+            dynamic_axes={
+                "input": {0: "batch_size"},
+                "output": {0: "batch_size"},
+            },
         )
-        acquired = self.lock.acquire(timeout=10)
-        if not acquired:
-            env_server_logger.error(
-                "Timeout acquiring lock to save weights. Skipping save."
+
+        if was_training:
+            self.network.train()
+
+        # Newer exporters may move larger initializers into a sidecar file next to
+        # `filename`. The served model must be self-contained, so they are pulled
+        # back into the graph and the sidecars removed.
+        model = onnx.load(filename, load_external_data=False)
+        export_dir = os.path.dirname(filename)
+        sidecars = {
+            os.path.join(export_dir, entry.value)
+            for init in model.graph.initializer
+            for entry in init.external_data
+            if entry.key == "location"
+        }
+        if sidecars:
+            load_external_data_for_model(model, export_dir)
+            onnx.save(model, filename)
+            for sidecar in sidecars:
+                os.remove(sidecar)
+        initializer_names = {init.name for init in model.graph.initializer}
+        if initializer_names == set(self.network.state_dict()):
+            self._onnx_template = model
+        else:
+            env_server_logger.debug(
+                "ONNX initializers do not match the network parameters; "
+                "every save will re-export the network."
+            )
+
+    def _write_onnx_from_template(self, filename: str) -> None:
+        """Writes the template graph with the current network weights as initializers."""
+        state = self.network.state_dict()
+        for init in self._onnx_template.graph.initializer:
+            init.CopyFrom(
+                numpy_helper.from_array(
+                    state[init.name].detach().cpu().numpy(), init.name
+                )
             )
+        onnx.save(self._onnx_template, filename)
+
+    def _save_checkpoint(self, wait: bool = False) -> None:
+        """
+        Writes the PyTorch checkpoint (network and optimizer state) from a snapshot
+        of the current state. The file is not served, so self.lock is not needed.
+
+        Args:
+            wait: Write in the calling thread instead of a background thread.
+        """
+        if self._checkpoint_thread is not None:
+            self._checkpoint_thread.join()
+            self._checkpoint_thread = None
+
+        snapshot = {
+            "updates": self.updates_counter,
+            "model_state_dict": copy.deepcopy(self.network.state_dict()),
+            "optimizer_state_dict": copy.deepcopy(self.optimizer.state_dict()),
+        }
+        if wait:
+            self._write_checkpoint(snapshot)
             return
-        env_server_logger.debug("Lock acquired for saving.")
+        self._checkpoint_thread = threading.Thread(
+            target=self._write_checkpoint,
+            args=(snapshot,),
+            name=threading.current_thread().name + "-Checkpoint",
+            daemon=True,
+        )
+        self._checkpoint_thread.start()
+
+    def _write_checkpoint(self, snapshot: Dict[str, Any]) -> None:
+        pytorch_checkpoint_file = self.onnx_weights_filename.replace(".onnx", ".pt")
+        pytorch_temp_filename = pytorch_checkpoint_file + ".tmp"
+        try:
+            torch.save(snapshot, pytorch_temp_filename)
+            os.replace(pytorch_temp_filename, pytorch_checkpoint_file)
+            env_server_logger.info(
+                f"Saved PyTorch checkpoint ({snapshot['updates']} updates)."
+            )
+        except Exception as e:
+            env_server_logger.error(
+                f"Failed to save PyTorch checkpoint: {e}", exc_info=True
+            )
+            if os.path.exists(pytorch_temp_filename):
+                try:
+                    os.remove(pytorch_temp_filename)
+                except OSError as e_rem:
+                    env_server_logger.warning(
+                        f"Could not remove temp file {pytorch_temp_filename}: {e_rem}"
+                    )
+
+    def _save_network(self, checkpoint: bool = False, wait: bool = False) -> None:
+        """
+        Public method to save the network state. The lock shared with the
+        WeightServer is only held while the new files are swapped in.
+
+        Args:
+            checkpoint: Also write the PyTorch checkpoint.
+            wait: Write the checkpoint synchronously (used on shutdown).
+        """
+        env_server_logger.debug(
+            f"Saving network state (Update #{self.updates_counter})"
+        )
         try:
-            self._save_network_internal()
+            self._save_network_internal(publish_lock=self.lock)
         except Exception:
             env_server_logger.error("Save network failed (see previous error).")
-        finally:
-            env_server_logger.debug("Releasing lock after saving attempt.")
-            self.lock.release()
+        if checkpoint:
+            self._save_checkpoint(wait=wait)
 
     def start(self) -> None:
         env_server_logger.info("Starting EnvironmentServer background threads.")
@@ -314,24 +579,47 @@ class EnvironmentServer:
         thread_name = threading.current_thread().name + "-UDPListener"
         thread = threading.Thread(target=self._run, name=thread_name, daemon=True)
         thread.start()
+        self._trainer_thread = threading.Thread(
+            target=self._trainer_loop,
+            name=threading.current_thread().name + "-Trainer",
+            daemon=True,
+        )
+        self._trainer_thread.start()
 
     def shutdown(self):
         env_server_logger.info("EnvironmentServer shutdown requested.")
         self.shutdown_event.set()
+        self._train_event.set()
+        if self._trainer_thread is not None:
+            self._trainer_thread.join(timeout=10)
+            if self._trainer_thread.is_alive():
+                env_server_logger.warning(
+                    "Trainer thread did not finish within 10s of shutdown."
+                )
         self.writer.stop()
         env_server_logger.info("EnvironmentServer writer stopped.")
+        if self._dropped_transitions:
+            env_server_logger.info(
+                "Training fell behind ingest: dropped update credit for %d of %d "
+                "transitions (raise max_pending_updates or set it to 0 to keep them).",
+                self._dropped_transitions,
+                self._credited_transitions,
+            )
         env_server_logger.info("Performing final network save...")
-        self._save_network()
+        with self._network_lock:
+            self._save_network(checkpoint=True, wait=True)
 
     def _run(self) -> None:
         """Main server loop: listens for UDP packets and processes them."""
         try:
             sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RECV_BUFFER_SIZE)
             sock.bind((self.ip, self.port))
             sock.settimeout(1.0)
             env_server_logger.info(
-                f"Listening for client packets on UDP {self.ip}:{self.port}"
+                f"Listening for client packets on UDP {self.ip}:{self.port} "
+                f"(receive buffer {sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)} bytes)"
             )
         except OSError as e:
             env_server_logger.error(
@@ -340,35 +628,35 @@ class EnvironmentServer:
             )
             return
 
+        # Datagrams are received into one reusable buffer and parsed through
+        # memoryview slices of it, so the receive path allocates no bytes objects.
+        recv_buf = bytearray(self.packet_size + self.client_id_size + 256)
+        recv_view = memoryview(recv_buf)
+        nbytes = None
         while not self.shutdown_event.is_set():
             try:
-                buf, addr = sock.recvfrom(self.packet_size + self.client_id_size + 256)
-
-                if len(buf) < self.client_id_size:
-                    env_server_logger.warning(
-                        f"Received packet too small ({len(buf)} bytes) for client ID from {addr}"
-                    )
-                    continue
-
-                client_id = struct.unpack(CLIENT_ID_TYPE, buf[: self.client_id_size])[0]
-                packet_data = buf[self.client_id_size :]
-
-                if len(packet_data) != self.packet_size:
-                    env_server_logger.warning(
-                        f"Received packet from client {client_id}@{addr} with incorrect data size. "
-                        f"Expected {self.packet_size}, got {len(packet_data)}. Skipping."
-                    )
-                    continue
+                nbytes, addr = sock.recvfrom_into(recv_buf)
+                received = self._process_datagram(recv_view[:nbytes], addr)
 
-                unpacked_data = struct.unpack(self.packet_format, packet_data)
+                # Drain whatever is already queued before training, so updates
+                # are scheduled per burst of packets rather than per packet.
+                for _ in range(self.ingest_batch - 1):
+                    try:
+                        nbytes, addr = sock.recvfrom_into(
+                            recv_buf, 0, socket.MSG_DONTWAIT
+                        )
+                    except BlockingIOError:
+                        break
+                    received += self._process_datagram(recv_view[:nbytes], addr)
 
-                self._handle_transition(client_id, unpacked_data)
+                self._evaluate_pending_q_values()
+                self._train_on_new_transitions(received)
 
             except socket.timeout:
                 continue
             except struct.error as e:
                 env_server_logger.warning(
-                    f"Failed to unpack packet from {addr}: {e}. Packet length: {len(buf) if 'buf' in locals() else 'N/A'}. Expected format: '{self.packet_format}' (size {self.packet_size})"
+                    f"Failed to unpack packet from {addr}: {e}. Packet length: {nbytes if nbytes is not None else 'N/A'}. Expected format: '{self.packet_format}' (size {self.packet_size})"
                 )
             except ConnectionResetError:
                 env_server_logger.debug(
@@ -393,77 +681,206 @@ class EnvironmentServer:
         sock.close()
         env_server_logger.info("EnvironmentServer UDP listener thread finished.")
 
-    def _handle_transition(self, client_id: int, packet: Tuple) -> None:
-        env_server_logger.debug(f"Received transition from client {client_id}")
-        try:
-            transition_tensor = torch.tensor(
-                packet, dtype=torch.float32, device=self.device
-            ).unsqueeze(0)
-        except Exception as e:
-            env_server_logger.error(
-                f"Could not convert packet to tensor: {packet}, Error: {e}"
+    def _process_datagram(self, buf: memoryview, addr: Tuple) -> int:
+        """Validates and records one datagram. Returns 1 if a transition was recorded."""
+        if len(buf) < self.client_id_size:
+            env_server_logger.warning(
+                f"Received packet too small ({len(buf)} bytes) for client ID from {addr}"
             )
-            return
+            return 0
 
-        self.memory.record_transition(transition_tensor)
+        client_id = self._client_id_struct.unpack_from(buf)[0]
+        data_size = len(buf) - self.client_id_size
 
-        if client_id not in self.episodes:
-            self.episodes[client_id] = {"reward": 0.0, "length": 0, "q_values": []}
-
-        start_state_end_idx = self.state_dims
-        action_idx = start_state_end_idx
-        reward_idx = action_idx + 1
-        end_state_start_idx = reward_idx + 1
-        end_state_end_idx = end_state_start_idx + self.state_dims
-        terminal_idx = end_state_end_idx
+        if data_size != self.packet_size:
+            env_server_logger.warning(
+                f"Received packet from client {client_id}@{addr} with incorrect data size. "
+                f"Expected {self.packet_size}, got {data_size}. Skipping."
+            )
+            return 0
 
-        reward = packet[reward_idx]
-        terminal = bool(packet[terminal_idx])
-        end_state = torch.tensor(
-            packet[end_state_start_idx:end_state_end_idx],
-            dtype=torch.float32,
-            device=self.device,
+        self._handle_transition(
+            client_id, self._parse_packet(buf, offset=self.client_id_size)
         )
+        return 1
+
+    def _evaluate_pending_q_values(self) -> None:
+        """
+        Runs one batched forward pass over the next states queued since the last
+        call and adds each row's mean Q-value to its client's episode total.
+        """
+        if not self._pending_q_clients:
+            return
+        # The whole preallocated array is evaluated and the unused rows are
+        # ignored, so a compiled forward pass always sees the same shape.
+        states = torch.from_numpy(self._pending_q_states)
+        with self._network_lock:
+            if self._has_mode_dependent_layers:
+                self.network.eval()
+            with torch.inference_mode():
+                q_means = (
+                    self.network.fast_forward(states.to(self.device))
+                    .mean(dim=1)
+                    .tolist()
+                )
+            if self._has_mode_dependent_layers:
+                self.network.train()
+        for client_id, q_mean in zip(self._pending_q_clients, q_means):
+            episode = self.episodes.get(client_id)
+            if episode is not None:
+                episode.q_sum += q_mean
+        self._pending_q_clients.clear()
+
+    def _train_on_new_transitions(self, count: int) -> None:
+        """
+        Hands newly recorded transitions to the trainer thread. By default all of
+        them are kept as credit, one update per update_every transitions. With
+        max_pending_updates set, at most max_pending_updates * update_every
+        transitions are kept pending and the excess credit is dropped when training
+        falls behind. Dropped credit is counted and reported with the update scalars.
+        """
+        if count == 0 or len(self.memory) < self.batch_size:
+            return
+        with self._pending_lock:
+            pending = self._pending_transitions + count
+            if self.max_pending_updates:
+                pending_cap = self.max_pending_updates * self.update_every
+                self._dropped_transitions += max(0, pending - pending_cap)
+                pending = min(pending, pending_cap)
+            self._pending_transitions = pending
+            self._credited_transitions += count
+        self._train_event.set()
+
+    def _trainer_loop(self) -> None:
+        """
+        Runs one training update per update_every transitions recorded by _run. A
+        backlog is worked through at most ingest_batch updates per pass, so the
+        batches sampled at once stay bounded.
+        """
+        env_server_logger.info("Trainer thread started.")
+        while not self.shutdown_event.is_set():
+            if not self._train_event.wait(timeout=1.0):
+                continue
+            self._train_event.clear()
+            with self._pending_lock:
+                updates = min(
+                    self._pending_transitions // self.update_every, self.ingest_batch
+                )
+                self._pending_transitions -= updates * self.update_every
+                if self._pending_transitions >= self.update_every:
+                    self._train_event.set()
+            if updates == 0:
+                continue
+            try:
+                self.perform_update(n_steps=updates)
+            except Exception as e:
+                env_server_logger.error(
+                    f"Unexpected error in training update: {e}", exc_info=True
+                )
+        env_server_logger.info("EnvironmentServer trainer thread finished.")
+
+    def _report_dropped_transitions(self, step: int) -> None:
+        """
+        Sends the training credit totals to TensorBoard and logs any credit dropped
+        since the last report, so the ratio of updates to transitions stays visible.
+        """
+        with self._pending_lock:
+            credited = self._credited_transitions
+            dropped = self._dropped_transitions
+        if not credited:
+            return
+        self.writer.log_scalars(
+            {
+                "Train/Dropped_Transitions": dropped,
+                "Train/Trained_Transition_Fraction": 1.0 - dropped / credited,
+            },
+            step,
+        )
+        newly_dropped = dropped - self._reported_dropped_transitions
+        if newly_dropped:
+            self._reported_dropped_transitions = dropped
+            env_server_logger.debug(
+                "Trainer is behind: dropped credit for %d transitions "
+                "(%d of %d since start).",
+                newly_dropped,
+                dropped,
+                credited,
+            )
 
-        self.episodes[client_id]["reward"] += reward
-        self.episodes[client_id]["length"] += 1
-
-        self.network.eval()
-        with torch.no_grad():
-            q_values_next = self.network(end_state.unsqueeze(0)).squeeze(0)
-            self.episodes[client_id]["q_values"].append(q_values_next.mean().item())
-        self.network.train()
+    def _parse_packet(self, buf: memoryview, offset: int = 0) -> np.ndarray:
+        """
+        Decodes the transition packet starting at `offset` in `buf` into a float32 row
+        laid out as in packet_format. Reads straight from `buf`, without slicing it.
+        The returned row is reused, so it is only valid until the next call.
+        """
+        n = self.state_dims
+        transition = self._transition_row
+        transition[:n] = np.frombuffer(buf, dtype=">f4", count=n, offset=offset)
+        transition[n] = buf[offset + self._action_offset]
+        transition[n + 1 : 2 * n + 2] = np.frombuffer(
+            buf, dtype=">f4", count=n + 1, offset=offset + self._reward_offset
+        )
+        transition[-1] = buf[offset + self._terminal_offset] != 0
+        return transition
+
+    def _handle_transition(self, client_id: int, packet: np.ndarray) -> None:
+        env_server_logger.debug("Received transition from client %d", client_id)
+        with self._memory_lock:
+            self.memory.record_raw(packet)
+
+        episode = self.episodes.get(client_id)
+        if episode is None:
+            episode = self.episodes[client_id] = EpisodeStats()
+
+        reward = float(packet[self._reward_col])
+        terminal = bool(packet[self._terminal_col])
+
+        episode.reward += reward
+        episode.length += 1
+        if len(self._pending_q_clients) == len(self._pending_q_states):
+            self._evaluate_pending_q_values()
+        self._pending_q_states[len(self._pending_q_clients)] = packet[
+            self._end_state_cols
+        ]
+        self._pending_q_clients.append(client_id)
 
         if terminal:
+            self._evaluate_pending_q_values()
             env_server_logger.info(f"Terminal flag received for client {client_id}.")
             if client_id in self.episodes:
                 episode_info = self.episodes[client_id]
                 avg_q_episode = (
-                    np.mean(episode_info["q_values"])
-                    if episode_info["q_values"]
+                    episode_info.q_sum / episode_info.length
+                    if episode_info.length
                     else 0.0
                 )
 
                 env_server_logger.debug(
-                    f"Preparing to log episode for client {client_id}: "
-                    f"Length={episode_info['length']}, "
-                    f"Reward={episode_info['reward']:.3f}, "
-                    f"AvgQ={avg_q_episode:.3f}"
+                    "Preparing to log episode for client %d: "
+                    "Length=%d, Reward=%.3f, AvgQ=%.3f",
+                    client_id,
+                    episode_info.length,
+                    episode_info.reward,
+                    avg_q_episode,
                 )
 
-                if not np.isfinite(episode_info["reward"]):
+                if not np.isfinite(episode_info.reward):
                     env_server_logger.warning(
-                        f"Episode Reward is not finite: {episode_info['reward']}. Logging as 0."
+                        f"Episode Reward is not finite: {episode_info.reward}. Logging as 0."
                     )
-                    episode_info["reward"] = 0.0
+                    episode_info.reward = 0.0
 
                 self.writer.log_episode(
-                    length=episode_info["length"],
-                    reward=episode_info["reward"],
+                    length=episode_info.length,
+                    reward=episode_info.reward,
                     avg_q_value=avg_q_episode,
                 )
                 env_server_logger.debug(
-                    f"Client {client_id} episode end processed: Length={episode_info['length']}, Reward={episode_info['reward']:.3f}, AvgQ={avg_q_episode:.3f}"
+                    "Client %d episode end processed: Length=%d, Reward=%.3f, AvgQ=%.3f",
+                    client_id,
+                    episode_info.length,
+                    episode_info.reward,
+                    avg_q_episode,
                 )
                 del self.episodes[client_id]
             else:
@@ -471,41 +888,61 @@ class EnvironmentServer:
                     f"Received terminal=True for unknown/already cleared client_id {client_id}"
                 )
 
-        if len(self.memory) >= self.batch_size:
-            self.perform_update()
-        elif len(self.memory) < self.batch_size and self.updates_counter == 0:
+        if len(self.memory) < self.batch_size and self.updates_counter == 0:
             if len(self.memory) % 10 == 0 or len(self.memory) == 1:
                 env_server_logger.info(
                     f"Memory size {len(self.memory)}/{self.batch_size}. Waiting for samples..."
                 )
 
-    def perform_update(self) -> None:
+    def perform_update(self, n_steps: int = 1) -> None:
+        """
+        Runs n_steps training updates. The minibatches for all steps are sampled
+        from the replay memory in one call and moved to the device together.
+        """
         if len(self.memory) < self.batch_size:
             env_server_logger.debug(
-                f"Skipping update. Memory size {len(self.memory)} < Batch size {self.batch_size}"
+                "Skipping update. Memory size %d < Batch size %d",
+                len(self.memory),
+                self.batch_size,
             )
             return
 
         try:
-            sample = self.memory.get_batch(self.batch_size).to(self.device)
+            with self._memory_lock:
+                if self._copy_stream is None:
+                    samples = self.memory.get_batch(
+                        self.batch_size, device=self.device, num_batches=n_steps
+                    )
+                else:
+                    with torch.cuda.stream(self._copy_stream):
+                        samples = self.memory.get_batch(
+                            self.batch_size, device=self.device, num_batches=n_steps
+                        )
         except ValueError as e:
             env_server_logger.warning(f"Skipping update: {e}")
             return
 
+        if self._copy_stream is not None:
+            compute_stream = torch.cuda.current_stream(self.device)
+            compute_stream.wait_stream(self._copy_stream)
+            samples.record_stream(compute_stream)
+
+        # The network lock is taken per step, so the listener's Q estimates
+        # are not held up for the whole run of updates.
+        for sample in samples.split(self.batch_size):
+            if self.shutdown_event.is_set():
+                break
+            with self._network_lock:
+                self._update_network(sample)
+
+    def _update_network(self, sample: torch.Tensor) -> None:
+        """Runs one optimisation step on a sampled batch. Assumes _network_lock is held."""
+
         env_server_logger.debug(
-            f"Performing training update #{self.updates_counter + 1}"
+            "Performing training update #%d", self.updates_counter + 1
         )
 
-        start_state_end_idx = self.state_dims
-        action_idx = start_state_end_idx
-        reward_idx = action_idx + 1
-        end_state_start_idx = reward_idx + 1
-        end_state_end_idx = end_state_start_idx + self.state_dims
-        terminal_idx = end_state_end_idx
-
-        expected_cols = (
-            (2 * self.state_dims) + 1 + 1 + 1
-        )  # state + action + reward + next_state + terminal
+        expected_cols = self._terminal_col + 1
         if sample.shape[1] != expected_cols:
             env_server_logger.error(
                 f"Sample batch has incorrect columns. Expected {expected_cols}, got {sample.shape[1]}. "
@@ -513,87 +950,116 @@ class EnvironmentServer:
             )
             return
 
-        start_states = sample[:, :start_state_end_idx]
-        actions = sample[:, action_idx].long().unsqueeze(1)
-        rewards = sample[:, reward_idx]
-        end_states = sample[:, end_state_start_idx:end_state_end_idx]
-        terminals = sample[:, terminal_idx].bool()
-
-        self.network.train()
-
-        q_values_current = self.network(start_states)
-        q_values_for_actions_taken = q_values_current.gather(1, actions).squeeze(1)
+        # Column views into the sampled batch; only the action indices need
+        # a cast, into a buffer that is reused across updates.
+        start_states = sample[:, self._start_state_cols]
+        actions = self._batch_actions.copy_(
+            sample[:, self._action_col : self._action_col + 1]
+        )
+        rewards = sample[:, self._reward_col]
+        end_states = sample[:, self._end_state_cols]
+        not_terminal = 1.0 - sample[:, self._terminal_col]
 
-        with torch.no_grad():
-            self.network.eval()
-            q_values_next = self.network(end_states)
+        if self._has_mode_dependent_layers:
             self.network.train()
 
-            max_q_values_next = q_values_next.max(dim=1)[0]
-            max_q_values_next[terminals] = 0.0
-            target_q_values = rewards + self.gamma * max_q_values_next
-
-        loss = F.mse_loss(q_values_for_actions_taken, target_q_values)
+        step_args = (
+            self.network,
+            torch.cat((start_states, end_states)),
+            actions,
+            rewards,
+            not_terminal,
+            self.gamma,
+        )
+        try:
+            loss, q_values_current = self._q_step(*step_args)
+        except Exception as e:
+            if self._q_step is q_learning_step:
+                raise
+            env_server_logger.warning(
+                f"Compiled training step failed ({e}). Using eager training step."
+            )
+            self._q_step = q_learning_step
+            loss, q_values_current = self._q_step(*step_args)
 
         self.optimizer.zero_grad()
         loss.backward()
 
-        torch.nn.utils.clip_grad_norm_(self.network.parameters(), max_norm=1.0)
+        # foreach computes the per-tensor norms and scales the gradients in a
+        # handful of multi-tensor kernels instead of one launch per parameter.
+        torch.nn.utils.clip_grad_norm_(self._params, max_norm=1.0, foreach=True)
 
         self.optimizer.step()
 
         self.updates_counter += 1
         current_update_step = self.updates_counter
 
-        avg_reward_batch = rewards.mean().item()
-        avg_q_values_batch = q_values_current.mean(dim=0).detach().cpu().numpy()
-
-        self.writer.log_update(
-            loss=loss.item(),
-            avg_reward=avg_reward_batch,
-            avg_q_values=avg_q_values_batch,
-            update_step=current_update_step,
-        )
+        ring_idx = (current_update_step - 1) % self.scalar_log_every
+        with torch.no_grad():
+            torch.cat(
+                (
+                    loss.view(1),
+                    rewards.mean().view(1),
+                    q_values_current.mean(dim=0),
+                ),
+                out=self._scalar_ring[ring_idx],
+            )
+        self._scalar_ring_filled += 1
+
+        if ring_idx == self.scalar_log_every - 1:
+            # After a resume the first window may be only partly filled.
+            filled = self._scalar_ring[
+                self.scalar_log_every - self._scalar_ring_filled :
+            ]
+            self._scalar_ring_filled = 0
+            # The window maximum of the loss goes along in the same transfer, so
+            # single-step spikes stay visible next to the averages.
+            scalars = (
+                torch.cat((filled[:, 0].amax().view(1), filled.mean(dim=0)))
+                .cpu()
+                .numpy()
+            )
+            loss_max = float(scalars[0])
+            loss_value = float(scalars[1])
+            avg_reward_batch = float(scalars[2])
+            avg_q_values_batch = scalars[3:]
+
+            self.writer.log_update(
+                loss=loss_value,
+                avg_reward=avg_reward_batch,
+                avg_q_values=avg_q_values_batch,
+                update_step=current_update_step,
+            )
+            self.writer.log_scalars({"Train/Loss_Max": loss_max}, current_update_step)
+            env_server_logger.debug(
+                "Update %d: Loss=%.4f, AvgReward=%.4f",
+                current_update_step,
+                loss_value,
+                avg_reward_batch,
+            )
+            self._report_dropped_transitions(current_update_step)
 
         log_histograms_freq = 50
         if (
             self.writer.writer is not None
             and current_update_step % log_histograms_freq == 0
         ):
+            # Only the snapshots are taken here; the TensorBoard listener thread
+            # bins and writes them. copy=True keeps later in-place updates out.
+            histograms = {}
             for name, param in self.network.named_parameters():
+                tag = name.replace(".", "/")
                 if param.grad is not None:
-                    tb_tag = f"Gradients/{name.replace('.', '/')}"
-                    try:
-                        self.writer.writer.add_histogram(
-                            tb_tag,
-                            param.grad.cpu(),
-                            global_step=current_update_step,
-                        )
-                    except ValueError as ve:
-                        env_server_logger.warning(
-                            f"Skipping histogram log for {tb_tag} due to error: {ve}"
-                        )
-            for name, param in self.network.named_parameters():
-                if param.data is not None:
-                    tb_tag = f"Parameters/{name.replace('.', '/')}"
-                    try:
-                        self.writer.writer.add_histogram(
-                            tb_tag,
-                            param.data.cpu(),
-                            global_step=current_update_step,
-                        )
-                    except ValueError as ve:
-                        env_server_logger.warning(
-                            f"Skipping histogram log for {tb_tag} due to error: {ve}"
-                        )
-            self.writer.writer.flush()
-
-        env_server_logger.debug(
-            f"Update {current_update_step}: Loss={loss.item():.4f}, AvgReward={avg_reward_batch:.4f}"
-        )
+                    histograms[f"Gradients/{tag}"] = param.grad.detach().to(
+                        "cpu", copy=True
+                    )
+                histograms[f"Parameters/{tag}"] = param.detach().to("cpu", copy=True)
+            self.writer.log_histograms(histograms, current_update_step)
 
         if self.save_frequency > 0 and current_update_step % self.save_frequency == 0:
-            self._save_network()
+            self._save_network(
+                checkpoint=current_update_step % self.checkpoint_frequency == 0
+            )
             self.decrease_learning_rate()
 
     def decrease_learning_rate(self):
@@ -609,7 +1075,14 @@ class WeightServer:
     class _WeightHandler(BaseHTTPRequestHandler):
         server_onnx_filename: str = ""
         server_updates_filename: str = ""
-        server_lock: mp.Lock = None
+        server_lock: threading.Lock = None
+        server_model_cache: Dict[str, Any] = None
+
+        # Keep connections open between weight polls; every response carries a
+        # Content-Length. Idle connections are dropped after `timeout` seconds.
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+        timeout = 30
 
         def do_GET(self) -> None:
             if (
@@ -624,10 +1097,10 @@ class WeightServer:
                 return
 
             weight_server_logger.debug(
-                f"Weight request received from {self.client_address}"
+                "Weight request received from %s", self.client_address
             )
             weight_server_logger.debug(
-                f"Acquiring lock for {self.server_onnx_filename} in WeightHandler"
+                "Acquiring lock for %s in WeightHandler", self.server_onnx_filename
             )
             acquired = self.server_lock.acquire(timeout=5)
             if not acquired:
@@ -637,89 +1110,180 @@ class WeightServer:
                 self.send_error(503, "Service Unavailable (Lock timeout)")
                 return
             weight_server_logger.debug(
-                f"Lock acquired for {self.server_onnx_filename} in WeightHandler"
+                "Lock acquired for %s in WeightHandler", self.server_onnx_filename
             )
 
             try:
-                onnx_exists = os.path.exists(self.server_onnx_filename)
-                updates_exists = os.path.exists(self.server_updates_filename)
-
-                if onnx_exists and updates_exists:
-                    try:
-                        updates_count = "-1"
-                        try:
-                            with open(self.server_updates_filename, "r") as uf:
-                                updates_count = uf.read().strip()
-                        except Exception as e_read_update:
-                            weight_server_logger.error(
-                                f"Failed to read updates file {self.server_updates_filename}: {e_read_update}"
-                            )
-                            self.send_error(500, "Error reading server state")
-                            return
-
-                        with open(self.server_onnx_filename, "rb") as f:
-                            fs = os.fstat(f.fileno())
-                            self.send_response(200)
-                            self.send_header("Content-Type", "application/octet-stream")
-                            self.send_header("Content-Length", str(fs.st_size))
-                            self.send_header(MODEL_UPDATE_HEADER, updates_count)
-                            self.send_header(
-                                "Cache-Control", "no-cache, no-store, must-revalidate"
-                            )
-                            self.send_header("Pragma", "no-cache")
-                            self.send_header("Expires", "0")
-                            self.end_headers()
-                            self.wfile.write(f.read())
-                        weight_server_logger.debug(
-                            f"Sent weights file {self.server_onnx_filename} (Updates: {updates_count}) to {self.client_address}"
-                        )
-                    except FileNotFoundError:
-                        self.send_error(404, "Weights file disappeared")
-                        weight_server_logger.error(
-                            f"Weights file {self.server_onnx_filename} or {self.server_updates_filename} not found during read (race condition?)"
-                        )
-                    except Exception as e:
-                        self.send_error(500, f"Error reading weights file: {e}")
-                        weight_server_logger.error(
-                            f"Error serving weights file {self.server_onnx_filename}: {e}",
-                            exc_info=True,
-                        )
-                else:
-                    self.send_error(404, "Weights file or updates file not found")
-                    weight_server_logger.warning(
-                        f"Weights file {self.server_onnx_filename} (exists: {onnx_exists}) or "
-                        f"{self.server_updates_filename} (exists: {updates_exists}) "
-                        f"not found for request from {self.client_address} (checked after lock)."
-                    )
-
+                payload = self._read_model()
             finally:
                 weight_server_logger.debug(
-                    f"Releasing lock for {self.server_onnx_filename} in WeightHandler"
+                    "Releasing lock for %s in WeightHandler", self.server_onnx_filename
                 )
                 self.server_lock.release()
 
+            if payload is None:
+                return
+
+            # The lock is released before writing, so a slow client cannot
+            # hold up the next weight save.
+            updates_count, model_bytes = payload
+            # With Nagle disabled, corking (Linux only) lets the headers go out
+            # in the same segment as the start of the body.
+            # Uncorking only follows a successful write; if the write fails the
+            # connection is dropped anyway, and its error is the one reported.
+            self._set_cork(True)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(model_bytes)))
+            self.send_header(MODEL_UPDATE_HEADER, updates_count)
+            self.send_header("Cache-Control", "no-cache, no-store, must-revalidate")
+            self.send_header("Pragma", "no-cache")
+            self.send_header("Expires", "0")
+            self.end_headers()
+            self.wfile.write(model_bytes)
+            self._set_cork(False)
+            weight_server_logger.debug(
+                "Sent weights file %s (Updates: %s) to %s",
+                self.server_onnx_filename,
+                updates_count,
+                self.client_address,
+            )
+
+        def _set_cork(self, enabled: bool) -> None:
+            """Best effort: a client that already disconnected surfaces on the write."""
+            if hasattr(socket, "TCP_CORK"):
+                try:
+                    self.connection.setsockopt(
+                        socket.IPPROTO_TCP, socket.TCP_CORK, int(enabled)
+                    )
+                except OSError:
+                    pass
+
+        def _read_model(self) -> Optional[Tuple[str, bytes]]:
+            """
+            Returns (updates_count, onnx_bytes) for the current weights. The files are
+            only re-read when the ONNX file has been replaced since the last request.
+            Assumes the lock is held; sends an error response and returns None on failure.
+            """
+            try:
+                onnx_stat = os.stat(self.server_onnx_filename)
+            except FileNotFoundError:
+                onnx_stat = None
+            updates_exists = os.path.exists(self.server_updates_filename)
+
+            if onnx_stat is None or not updates_exists:
+                self.send_error(404, "Weights file or updates file not found")
+                weight_server_logger.warning(
+                    f"Weights file {self.server_onnx_filename} (exists: {onnx_stat is not None}) or "
+                    f"{self.server_updates_filename} (exists: {updates_exists}) "
+                    f"not found for request from {self.client_address} (checked after lock)."
+                )
+                return None
+
+            cache = self.server_model_cache
+            cache_key = (onnx_stat.st_ino, onnx_stat.st_mtime_ns, onnx_stat.st_size)
+            if cache.get("key") == cache_key:
+                return cache["updates"], cache["data"]
+
+            try:
+                with open(self.server_updates_filename, "r") as uf:
+                    updates_count = uf.read().strip()
+            except Exception as e_read_update:
+                weight_server_logger.error(
+                    f"Failed to read updates file {self.server_updates_filename}: {e_read_update}"
+                )
+                self.send_error(500, "Error reading server state")
+                return None
+
+            try:
+                with open(self.server_onnx_filename, "rb") as f:
+                    model_bytes = f.read()
+            except FileNotFoundError:
+                self.send_error(404, "Weights file disappeared")
+                weight_server_logger.error(
+                    f"Weights file {self.server_onnx_filename} or {self.server_updates_filename} not found during read (race condition?)"
+                )
+                return None
+            except Exception as e:
+                self.send_error(500, f"Error reading weights file: {e}")
+                weight_server_logger.error(
+                    f"Error serving weights file {self.server_onnx_filename}: {e}",
+                    exc_info=True,
+                )
+                return None
+
+            cache.update(key=cache_key, updates=updates_count, data=model_bytes)
+            return updates_count, model_bytes
+
         def log_request(self, code: int | str = "-", size: int | str = "-") -> None:
             if isinstance(code, int) and code < 400:
-                weight_server_logger.debug(f'Req: "{self.requestline}" {code} {size}')
+                weight_server_logger.debug(
+                    'Req: "%s" %s %s', self.requestline, code, size
+                )
             else:
                 weight_server_logger.info(f'Req: "{self.requestline}" {code} {size}')
 
         def log_error(self, format: str, *args) -> None:
+            if format.startswith("Request timed out"):
+                # An idle keep-alive connection reaching `timeout` is routine.
+                weight_server_logger.debug(f"Closing idle connection: {format % args}")
+                return
             weight_server_logger.error(f"HTTP Server Error: {format % args}")
 
+    class _HTTPServer(ThreadingHTTPServer):
+        """
+        ThreadingHTTPServer whose serve loop blocks until a connection arrives or
+        shutdown() writes to a socketpair, instead of waking every poll_interval
+        to check for a shutdown request.
+        """
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self._wakeup_r, self._wakeup_w = socket.socketpair()
+            self._stop_requested = False
+            self._stopped = threading.Event()
+
+        def serve_forever(self, poll_interval: Optional[float] = None) -> None:
+            self._stopped.clear()
+            try:
+                with selectors.DefaultSelector() as selector:
+                    selector.register(self, selectors.EVENT_READ)
+                    selector.register(self._wakeup_r, selectors.EVENT_READ)
+                    while not self._stop_requested:
+                        ready = selector.select(poll_interval)
+                        if self._stop_requested:
+                            break
+                        if any(key.fileobj is self for key, _ in ready):
+                            self._handle_request_noblock()
+                        self.service_actions()
+            finally:
+                self._stop_requested = False
+                self._stopped.set()
+
+        def shutdown(self) -> None:
+            self._stop_requested = True
+            self._wakeup_w.send(b"\0")
+            self._stopped.wait()
+
+        def server_close(self) -> None:
+            super().server_close()
+            self._wakeup_r.close()
+            self._wakeup_w.close()
+
     def __init__(
         self,
         ip: str,
         port: int,
         onnx_filename: str,
         updates_filename: str,
-        lock: mp.Lock,
+        lock: threading.Lock,
     ):
         self.ip = ip
         self.port = port
         self.onnx_filename = onnx_filename
         self.updates_filename = updates_filename
         self.lock = lock
+        self.model_cache: Dict[str, Any] = {}
         self.httpd = None
         self.shutdown_event = threading.Event()
 
@@ -728,6 +1292,7 @@ class WeightServer:
             server_onnx_filename = self.onnx_filename
             server_updates_filename = self.updates_filename
             server_lock = self.lock
+            server_model_cache = self.model_cache
 
         return CustomHandler
 
@@ -751,11 +1316,13 @@ class WeightServer:
         """Runs the HTTP server loop."""
         try:
             handler_class = self._create_handler_class()
-            self.httpd = HTTPServer((self.ip, self.port), handler_class)
+            # One thread per connection, so an idle keep-alive client cannot
+            # hold up the others.
+            self.httpd = self._HTTPServer((self.ip, self.port), handler_class)
             weight_server_logger.info(
                 f"Listening for weight requests on http://{self.ip}:{self.port}"
             )
-            self.httpd.serve_forever(poll_interval=0.5)
+            self.httpd.serve_forever()
 
         except OSError as e:
             if not self.shutdown_event.is_set():
@@ -1,9 +1,11 @@
 import logging
+import math
+import queue
 import threading
-import torch.multiprocessing as mp
 import numpy as np
+import torch
 from torch.utils.tensorboard import SummaryWriter
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple
 from queue import Empty, Full
 import os
 
@@ -15,14 +17,29 @@ LogMsgEpisode = Tuple[
 LogMsgUpdate = Tuple[
     int, float, float, np.ndarray, int
 ]  # Type=1, Loss, AvgReward, AvgQValues (array), Step
+LogMsgHistograms = Tuple[
+    int, Dict[str, torch.Tensor], int
+]  # Type=2, {Tag: CPU tensor snapshot}, Step
+LogMsgScalars = Tuple[int, Dict[str, float], int]  # Type=3, {Tag: Value}, Step
 
 
 class TensorBoardWriter:
     """
     Logs metrics asynchronously to TensorBoard using a separate thread.
     Manages the underlying SummaryWriter instance.
+
+    Producers and the listener live in the same process, so messages go
+    through an in-process queue and are never pickled.
     """
-    queue = mp.Queue(maxsize=1000)
+
+    MAX_DRAIN = 64
+    # The SummaryWriter's own background thread flushes on this interval;
+    # the listener only flushes once more when it exits.
+    FLUSH_SECS = 5
+    # Each per-action scalar is a separate event, so they are only written with
+    # the first update message at or past every Nth training update; the Q
+    # histogram is written for every message.
+    Q_ACTION_SCALARS_EVERY_UPDATES = 100
 
     def __init__(self, log_dir: str):
         """
@@ -32,16 +49,20 @@ class TensorBoardWriter:
             log_dir: The directory where TensorBoard logs will be saved.
         """
         self.log_dir = log_dir
+        self.queue: queue.Queue = queue.Queue(maxsize=1000)
         self.writer: Optional[SummaryWriter] = None
         self.episode_count = 0
         self.update_count = 0
+        self._next_q_action_step = 0
         self._thread: Optional[threading.Thread] = None
         self._stop_event = threading.Event()
         logger.info(f"Initializing. Logging to: {self.log_dir}")
 
         try:
             os.makedirs(self.log_dir, exist_ok=True)
-            self.writer = SummaryWriter(log_dir=self.log_dir)
+            self.writer = SummaryWriter(
+                log_dir=self.log_dir, flush_secs=self.FLUSH_SECS
+            )
             logger.info("SummaryWriter instance created successfully in __init__.")
         except Exception as e:
             logger.error(
@@ -80,7 +101,7 @@ class TensorBoardWriter:
         logger.info("Stopping TensorBoard listener thread...")
         self._stop_event.set()
         try:
-            TensorBoardWriter.queue.put(None, block=False)
+            self.queue.put(None, block=False)
         except Full:
             logger.debug(
                 "Queue full while trying to put sentinel, listener might be blocked."
@@ -112,99 +133,25 @@ class TensorBoardWriter:
 
         while not self._stop_event.is_set():
             try:
-                log_data = TensorBoardWriter.queue.get(timeout=1.0)
-
-                if log_data is None:
-                    logger.debug("Received sentinel value, exiting listener loop.")
-                    break
-
-                log_type = log_data[0]
-
-                if log_type == 0:
-                    logger.debug(f"Received episode log data from queue: {log_data}")
-                    if len(log_data) != 4:
-                        logger.error(f"Invalid episode log message format: {log_data}")
-                        continue
-                    _, length, reward, avg_q_value = log_data
-                    step = self.episode_count
-                    logger.debug(
-                        f"Writing episode scalars: Step={step}, Len={length}, Rew={reward:.3f}, AvgQ={avg_q_value:.3f}"
-                    )
-                    try:
-                        self.writer.add_scalar(
-                            "Episode/Length", length, global_step=step
-                        )
-                        self.writer.add_scalar(
-                            "Episode/Reward", reward, global_step=step
-                        )
-                        self.writer.add_scalar(
-                            "Episode/Average_Q_Value", avg_q_value, global_step=step
-                        )
-                        logger.debug(
-                            f"Successfully wrote episode scalars for step {step}"
-                        )
-                        self.episode_count += 1
-                        if self.episode_count % 50 == 0:
-                            self.writer.flush()
-                    except Exception as e:
-                        logger.error(
-                            f"Error writing episode scalar to TensorBoard: {e}",
-                            exc_info=True,
-                        )
-
-                elif log_type == 1:
-                    if len(log_data) != 5:
-                        logger.error(f"Invalid update log message format: {log_data}")
-                        continue
-                    _, loss, avg_reward, avg_q_values_data, update_step = log_data
-                    step = update_step
-                    self.update_count = step
-
-                    try:
-                        self.writer.add_scalar("Train/Loss", loss, global_step=step)
-                        self.writer.add_scalar(
-                            "Train/Average_Reward_Batch", avg_reward, global_step=step
-                        )
-                        try:
-                            if not isinstance(avg_q_values_data, np.ndarray):
-                                logger.debug(
-                                    f"Attempting conversion for avg_q_values type: {type(avg_q_values_data)}"
-                                )
-                                avg_q_values_array = np.array(avg_q_values_data)
-                            else:
-                                avg_q_values_array = avg_q_values_data
-
-                            for i, q_val in enumerate(avg_q_values_array):
-                                self.writer.add_scalar(
-                                    f"Train/Avg_Q_Action_{i}_Batch",
-                                    q_val,
-                                    global_step=step,
-                                )
-                            self.writer.add_histogram(
-                                "Train/Avg_Q_Distribution_Batch",
-                                avg_q_values_array,
-                                global_step=step,
-                            )
-                            logger.debug(f"Logged train Q values for step {step}")
-                        except Exception as q_err:
-                            logger.error(
-                                f"Failed to process/log avg_q_values (orig type: {type(avg_q_values_data)}): {q_err}",
-                                exc_info=True,
-                            )
-
-                        if step % 100 == 0:
-                            self.writer.flush()
-                    except Exception as e:
-                        logger.error(
-                            f"Error writing update data to TensorBoard (step {step}): {e}",
-                            exc_info=True,
-                        )
-
-                else:
-                    logger.warning(f"Unknown log message type received: {log_type}")
-
+                batch = [self.queue.get(timeout=1.0)]
             except Empty:
                 continue
+
+            # Drain whatever else is already queued so a burst of updates is
+            # written in one pass instead of one wake-up per message.
+            try:
+                while len(batch) < self.MAX_DRAIN:
+                    batch.append(self.queue.get_nowait())
+            except Empty:
+                pass
+
+            try:
+                for log_data in batch:
+                    if log_data is None:
+                        logger.debug("Received sentinel value, exiting listener loop.")
+                        self._stop_event.set()
+                        break
+                    self._write_message(log_data)
             except Exception as e:
                 logger.error(f"Error in listener thread loop: {e}", exc_info=True)
                 if isinstance(e, (IOError, OSError)) and self.writer:
@@ -222,6 +169,103 @@ class TensorBoardWriter:
             except Exception as e:
                 logger.error(f"Error during final flush: {e}", exc_info=True)
 
+    def _write_message(self, log_data: Tuple) -> None:
+        """Writes a single queued episode or update message to the SummaryWriter."""
+        log_type = log_data[0]
+
+        if log_type == 0:
+            logger.debug("Received episode log data from queue: %s", log_data)
+            if len(log_data) != 4:
+                logger.error(f"Invalid episode log message format: {log_data}")
+                return
+            _, length, reward, avg_q_value = log_data
+            step = self.episode_count
+            logger.debug(
+                "Writing episode scalars: Step=%d, Len=%d, Rew=%.3f, AvgQ=%.3f",
+                step,
+                length,
+                reward,
+                avg_q_value,
+            )
+            try:
+                self.writer.add_scalar("Episode/Length", length, global_step=step)
+                self.writer.add_scalar("Episode/Reward", reward, global_step=step)
+                self.writer.add_scalar(
+                    "Episode/Average_Q_Value", avg_q_value, global_step=step
+                )
+                logger.debug("Successfully wrote episode scalars for step %d", step)
+                self.episode_count += 1
+            except Exception as e:
+                logger.error(
+                    f"Error writing episode scalar to TensorBoard: {e}",
+                    exc_info=True,
+                )
+
+        elif log_type == 1:
+            if len(log_data) != 5:
+                logger.error(f"Invalid update log message format: {log_data}")
+                return
+            _, loss, avg_reward, avg_q_values, update_step = log_data
+            step = update_step
+            self.update_count = step
+
+            try:
+                self.writer.add_scalar("Train/Loss", loss, global_step=step)
+                self.writer.add_scalar(
+                    "Train/Average_Reward_Batch", avg_reward, global_step=step
+                )
+                try:
+                    if step >= self._next_q_action_step:
+                        for i, q_val in enumerate(avg_q_values):
+                            self.writer.add_scalar(
+                                f"Train/Avg_Q_Action_{i}_Batch",
+                                q_val,
+                                global_step=step,
+                            )
+                        every = self.Q_ACTION_SCALARS_EVERY_UPDATES
+                        self._next_q_action_step = step - step % every + every
+                    self.writer.add_histogram(
+                        "Train/Avg_Q_Distribution_Batch",
+                        avg_q_values,
+                        global_step=step,
+                    )
+                    logger.debug("Logged train Q values for step %d", step)
+                except Exception as q_err:
+                    logger.error(
+                        f"Failed to log avg_q_values for step {step}: {q_err}",
+                        exc_info=True,
+                    )
+            except Exception as e:
+                logger.error(
+                    f"Error writing update data to TensorBoard (step {step}): {e}",
+                    exc_info=True,
+                )
+
+        elif log_type == 2:
+            if len(log_data) != 3:
+                logger.error(f"Invalid histogram log message format: {log_data}")
+                return
+            _, histograms, step = log_data
+            for tag, values in histograms.items():
+                try:
+                    self.writer.add_histogram(tag, values, global_step=step)
+                except ValueError as ve:
+                    logger.warning(
+                        f"Skipping histogram log for {tag} due to error: {ve}"
+                    )
+            logger.debug("Logged %d histograms for step %d", len(histograms), step)
+
+        elif log_type == 3:
+            if len(log_data) != 3:
+                logger.error(f"Invalid scalars log message format: {log_data}")
+                return
+            _, scalars, step = log_data
+            for tag, value in scalars.items():
+                self.writer.add_scalar(tag, value, global_step=step)
+
+        else:
+            logger.warning(f"Unknown log message type received: {log_type}")
+
     def log_episode(self, length: int, reward: float, avg_q_value: float) -> None:
         """
         Queues episode summary data for logging.
@@ -231,17 +275,16 @@ class TensorBoardWriter:
             reward: Total reward accumulated in the episode.
             avg_q_value: Average Q-value over the episode (scalar).
         """
-        if not np.isfinite(avg_q_value):
+        if not math.isfinite(avg_q_value):
             logger.warning(
                 f"Received non-finite avg_q_value for episode: {avg_q_value}. Logging as 0."
             )
             avg_q_value = 0.0
         msg: LogMsgEpisode = (0, length, reward, avg_q_value)
-        logger.debug(f"Queueing episode log message: {msg}")
+        logger.debug("Queueing episode log message: %s", msg)
         try:
-            TensorBoardWriter.queue.put(msg, block=False)
-        except Full:
-            logger.warning("TensorBoard queue is full. Episode log message dropped.")
+            if not self._put_latest(msg):
+                logger.debug("Writer is stopping. Episode log message dropped.")
         except Exception as e:
             logger.error(f"Failed to queue episode log: {e}", exc_info=True)
 
@@ -254,27 +297,106 @@ class TensorBoardWriter:
         Args:
             loss: The loss value for the training batch.
             avg_reward: The average reward in the training batch.
-            avg_q_values: Average Q-values per action over the batch. Shape (action_dims,).
+            avg_q_values: Average Q-values per action over the batch as a numpy array.
+                          Shape (action_dims,). Other array-likes are converted;
+                          numpy arrays are queued without a copy.
             update_step: The current training update step number.
         """
-        if not np.isfinite(loss):
+        if not math.isfinite(loss):
             logger.warning(f"Received non-finite loss: {loss}. Skipping update log.")
             return
-        if not np.isfinite(avg_reward):
+        if not math.isfinite(avg_reward):
             logger.warning(
                 f"Received non-finite avg_reward: {avg_reward}. Logging as 0."
             )
             avg_reward = 0.0
 
-        msg: LogMsgUpdate = (1, loss, avg_reward, avg_q_values, update_step)
-        logger.debug(f"Queueing update log message for step {update_step}")
         try:
-            TensorBoardWriter.queue.put(msg, block=False)
-        except Full:
+            avg_q_values = np.asarray(avg_q_values)
+        except (TypeError, ValueError) as e:
+            avg_q_values = None
+            logger.debug("Could not convert avg_q_values: %s", e)
+        if avg_q_values is None or avg_q_values.dtype.kind not in "biuf":
             logger.warning(
-                f"TensorBoard queue is full. Update log message for step {update_step} dropped."
+                f"Received non-numeric avg_q_values. Skipping update log for step {update_step}."
             )
+            return
+
+        msg: LogMsgUpdate = (1, loss, avg_reward, avg_q_values, update_step)
+        logger.debug("Queueing update log message for step %d", update_step)
+        try:
+            if not self._put_latest(msg):
+                logger.debug(
+                    "Writer is stopping. Update log message for step %d dropped.",
+                    update_step,
+                )
         except Exception as e:
             logger.error(
                 f"Failed to queue update log for step {update_step}: {e}", exc_info=True
             )
+
+    def log_histograms(self, histograms: Dict[str, torch.Tensor], step: int) -> None:
+        """
+        Queues histograms for logging; the listener thread writes them.
+
+        Args:
+            histograms: Mapping of TensorBoard tag to a CPU tensor. The tensors must be
+                        snapshots that the caller no longer modifies.
+            step: The global step to log the histograms at.
+        """
+        msg: LogMsgHistograms = (2, histograms, step)
+        logger.debug("Queueing %d histograms for step %d", len(histograms), step)
+        try:
+            if not self._put_latest(msg):
+                logger.debug(
+                    "Writer is stopping. Histograms for step %d dropped.", step
+                )
+        except Exception as e:
+            logger.error(
+                f"Failed to queue histograms for step {step}: {e}", exc_info=True
+            )
+
+    def log_scalars(self, scalars: Dict[str, float], step: int) -> None:
+        """
+        Queues additional scalars for logging.
+
+        Args:
+            scalars: Mapping of TensorBoard tag to value.
+            step: The global step to log the scalars at.
+        """
+        msg: LogMsgScalars = (3, scalars, step)
+        logger.debug("Queueing %d scalars for step %d", len(scalars), step)
+        try:
+            if not self._put_latest(msg):
+                logger.debug("Writer is stopping. Scalars for step %d dropped.", step)
+        except Exception as e:
+            logger.error(f"Failed to queue scalars for step {step}: {e}", exc_info=True)
+
+    def _put_latest(self, msg: Tuple) -> bool:
+        """
+        Queues a message without blocking. When the queue is full, the oldest queued
+        message is dropped to make room, so a backlog loses its stale entries rather
+        than the most recent ones.
+
+        Returns:
+            False if the message was not queued because the writer is stopping.
+        """
+        while True:
+            try:
+                self.queue.put(msg, block=False)
+                return True
+            except Full:
+                pass
+            if self._stop_event.is_set():
+                return False
+            try:
+                oldest = self.queue.get_nowait()
+            except Empty:
+                continue
+            if oldest is None:
+                # The stop sentinel; stop() has been called.
+                return False
+            logger.warning(
+                "TensorBoard queue is full. Dropped the oldest queued message (type %d).",
+                oldest[0],
+            )
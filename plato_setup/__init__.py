@@ -1,14 +1,40 @@
-from .config import Config, ConfigError
-from .logger import setup_logging, log_info, log_warn, log_error, log_debug
-from .utils import check_required_commands, clean_log_directory
-from .process_manager import ProcessManager
-from .tasks import (
-    generate_battle_file,
-    compile_robot,
-    check_robot_compiled,
-    start_tensorboard,
-    start_server,
-    wait_for_server_ports,
-    start_robocode_instance,
-)
-from .constants import SCRIPT_NAME, SCRIPT_VERSION
+import importlib
+
+# Submodules are imported on first attribute access (PEP 562), so importing
+# e.g. plato_setup.constants does not pull in YAML parsing or task helpers.
+_EXPORTS = {
+    "Config": ".config",
+    "ConfigError": ".config",
+    "setup_logging": ".logger",
+    "log_info": ".logger",
+    "log_warn": ".logger",
+    "log_error": ".logger",
+    "log_debug": ".logger",
+    "check_required_commands": ".utils",
+    "clean_log_directory": ".utils",
+    "ProcessManager": ".process_manager",
+    "generate_battle_file": ".tasks",
+    "compile_robot": ".tasks",
+    "check_robot_compiled": ".tasks",
+    "start_tensorboard": ".tasks",
+    "start_server": ".tasks",
+    "wait_for_server_ports": ".tasks",
+    "start_robocode_instance": ".tasks",
+    "SCRIPT_NAME": ".constants",
+    "SCRIPT_VERSION": ".constants",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,11 +1,18 @@
 import logging
 import os
 import shutil
+import stat
+from collections import deque
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
 import yaml
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
 from .constants import (
     DEFAULT_CONFIG_FILENAME,
     DEFAULT_LOG_DIR_REL,
@@ -59,6 +66,23 @@ class ConfigError(Exception):
     pass
 
 
+def flatten_dict(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Flattens a nested dict into a single dict keyed by dotted paths.
+    Every level is kept, so both 'server' and 'server.ip' are present.
+    """
+    flat: Dict[str, Any] = {}
+    stack = deque([(data, "")])
+    while stack:
+        node, prefix = stack.pop()
+        for key, value in node.items():
+            full_key = f"{prefix}{key}"
+            flat[full_key] = value
+            if isinstance(value, dict):
+                stack.append((value, f"{full_key}."))
+    return flat
+
+
 class Config:
     def __init__(
         self,
@@ -71,11 +95,13 @@ class Config:
         self.data: Dict[str, Any] = {}
         self.paths: Dict[str, Path] = {}
         self.required_commands = list(BASE_REQUIRED_COMMANDS)
+        self._flat: Optional[Dict[str, Any]] = None
 
         self._load_and_validate_base()
         self._apply_overrides()
         self._derive_paths()
         self._post_validation()
+        self._flat = flatten_dict(self.data)
 
     def _load_and_validate_base(self):
         log.info(f"Loading configuration from: {self.config_path}")
@@ -84,7 +110,7 @@ class Config:
 
         try:
             with open(self.config_path, "r") as f:
-                raw_config = yaml.safe_load(f)
+                raw_config = yaml.load(f, Loader=SafeLoader)
         except yaml.YAMLError as e:
             raise ConfigError(f"Error parsing YAML file {self.config_path}: {e}")
         except Exception as e:
@@ -134,9 +160,15 @@ class Config:
         server_cfg.setdefault("gamma", 0.99)
         server_cfg.setdefault("batch_size", 32)
         server_cfg.setdefault("replay_capacity", 10000)
+        server_cfg.setdefault("replay_dtype", "float32")
         server_cfg.setdefault("save_frequency", 1000)
         server_cfg.setdefault("weights_file_name", "network_weights.onnx")
         server_cfg.setdefault("device", "auto")
+        server_cfg.setdefault("ingest_batch", 64)
+        server_cfg.setdefault("update_every", 1)
+        server_cfg.setdefault("max_pending_updates", 0)
+        server_cfg.setdefault("compile_network", False)
+        server_cfg.setdefault("quantize_onnx", False)
 
         script_b_cfg = raw_config["script_behavior"]
         script_b_cfg.setdefault("clean_logs", True)
@@ -240,7 +272,11 @@ class Config:
         log.debug(f"Generated battle file path: {self.paths['generated_battle_file']}")
 
     def _post_validation(self):
-        if not self.paths["robocode_home"].is_dir():
+        try:
+            home_is_dir = stat.S_ISDIR(os.stat(self.paths["robocode_home"]).st_mode)
+        except OSError:
+            home_is_dir = False
+        if not home_is_dir:
             raise ConfigError(
                 f"Robocode home directory not found or not a directory: {self.paths['robocode_home']}"
             )
@@ -289,6 +325,8 @@ class Config:
             "script_behavior.clean_logs": False,
             "script_behavior.compile_robot": False,
             "script_behavior.tail_logs": False,
+            "server.compile_network": False,
+            "server.quantize_onnx": False,
         }
         for key_path, is_required in boolean_keys.items():
             value = self.get(key_path)
@@ -348,6 +386,9 @@ class Config:
             "server.batch_size": int,
             "server.replay_capacity": int,
             "server.save_frequency": int,
+            "server.ingest_batch": int,
+            "server.update_every": int,
+            "server.max_pending_updates": int,
             "script_behavior.initial_server_wait": int,
         }
         for key_path, num_type in numeric_keys.items():
@@ -381,6 +422,10 @@ class Config:
         log.info("Configuration loaded and validated successfully.")
 
     def get(self, key_path: str, default: Any = None) -> Any:
+        if self._flat is not None:
+            value = self._flat.get(key_path)
+            return value if value is not None else default
+
         keys = key_path.split(".")
         value = self.data
         try:
@@ -406,6 +451,12 @@ class Config:
             d[keys[-1]] = value
         except Exception as e:
             log.error(f"Failed to set config key '{key_path}': {e}")
+        if self._flat is not None:
+            self._flat = flatten_dict(self.data)
+
+    def get_section(self, section: str) -> Dict[str, Any]:
+        value = self.data.get(section)
+        return value if isinstance(value, dict) else {}
 
     def get_path(self, key: str) -> Optional[Path]:
         return self.paths.get(key)
@@ -374,8 +374,14 @@ class ProcessManager:
     # ... (No changes needed in ProcessManager itself, the logic is in ManagedProcess) ...
     def __init__(self):
         self.processes: Dict[str, ManagedProcess] = {}
+        # Live index of robocode_* processes, so the supervisor loop does not
+        # have to scan every managed process to find them.
+        self._robocode: Dict[str, ManagedProcess] = {}
         self.tail_logs_globally = False
         self._lock = threading.Lock()  # Lock for accessing self.processes dict
+        # Set by stop_all; processes that finish starting afterwards are stopped
+        # instead of registered, so a concurrent startup cannot leave orphans.
+        self._stopping = False
 
     def start_process(
         self,
@@ -390,38 +396,54 @@ class ProcessManager:
         env: Optional[Dict[str, str]] = None,
     ) -> bool:
         with self._lock:
+            if self._stopping:
+                log.warning(f"Not starting '{name}': shutdown in progress.")
+                return False
             if name in self.processes and self.processes[name].is_alive():
                 # Note: is_alive might be unreliable for tmux case after initial start
                 log.warning(f"Process with name '{name}' is already managed.")
                 # Maybe check tmux list-windows here if name starts with robocode_?
                 return True  # Assume it's okay?
 
-            # Pass the redirection arguments to ManagedProcess constructor
-            process = ManagedProcess(
-                name,
-                cmd,
-                cwd,
-                log_path,
-                log_prefix,
-                stdout_redir=stdout_redir,
-                stderr_redir=stderr_redir,
-                start_new_session=start_new_session,
-                env=env,
-            )
-            started = process.start(tail_logs=self.tail_logs_globally)
-            if started:
+        # Pass the redirection arguments to ManagedProcess constructor
+        process = ManagedProcess(
+            name,
+            cmd,
+            cwd,
+            log_path,
+            log_prefix,
+            stdout_redir=stdout_redir,
+            stderr_redir=stderr_redir,
+            start_new_session=start_new_session,
+            env=env,
+        )
+        # Started outside the lock so independent processes can launch concurrently.
+        started = process.start(tail_logs=self.tail_logs_globally)
+        if not started:
+            return False
+        with self._lock:
+            stopping = self._stopping
+            if not stopping:
                 self.processes[name] = process
-            return started
+                if name.startswith("robocode_"):
+                    self._robocode[name] = process
+        if stopping:
+            log.warning(f"Stopping '{name}': it started after shutdown began.")
+            process.stop()
+            return False
+        return True
 
     def stop_all(self):
         log.warning("Stopping all managed processes...")
         with self._lock:
+            self._stopping = True
             names = list(self.processes.keys())
 
         for name in reversed(names):  # Stop e.g. robots before server?
             process_to_stop = None
             with self._lock:
                 process_to_stop = self.processes.pop(name, None)
+                self._robocode.pop(name, None)
 
             if process_to_stop:
                 log.debug(f"Initiating stop for {name}")
@@ -434,11 +456,13 @@ class ProcessManager:
                     f"Processes remaining after stop_all: {list(self.processes.keys())}"
                 )
                 self.processes.clear()
+            self._robocode.clear()
 
     def stop_process(self, name: str):
         process_to_stop = None
         with self._lock:
             process_to_stop = self.processes.pop(name, None)
+            self._robocode.pop(name, None)
 
         if process_to_stop:
             log.info(f"Stopping specific process: {name}")
@@ -452,6 +476,13 @@ class ProcessManager:
         with self._lock:
             return self.processes.get(name)
 
+    def prune_robocode_processes(self) -> int:
+        """Drops exited Robocode instances from the live index and returns how many remain."""
+        with self._lock:
+            for name in [n for n, p in self._robocode.items() if not p.is_alive()]:
+                del self._robocode[name]
+            return len(self._robocode)
+
     def get_all_pids(self) -> List[int]:
         pids = []
         with self._lock:
@@ -2,6 +2,7 @@ import logging
 import os
 import subprocess
 import shlex
+import threading
 from pathlib import Path
 from typing import Optional, List
 
@@ -31,6 +32,8 @@ from .utils import expand_classpath_wildcards, wait_for_ports, check_robot_class
 
 log = logging.getLogger(__name__)
 
+_tmux_session_lock = threading.Lock()
+
 
 def generate_battle_file(
     cfg: Config, base_battle_file_path: Optional[Path] = None
@@ -118,8 +121,7 @@ def generate_battle_file(
     try:
         output_path.parent.mkdir(parents=True, exist_ok=True)
         with open(output_path, "w") as f_out:
-            for line in final_lines:
-                f_out.write(line + "\n")
+            f_out.write("\n".join(final_lines) + "\n")
         log.info("Battle file generated successfully.")
         return True
     except Exception as e:
@@ -316,13 +318,25 @@ def start_server(cfg: Config, pm: ProcessManager) -> bool:
         str(cfg.get("server.batch_size", 32)),
         "--replay-capacity",
         str(cfg.get("server.replay_capacity", 10000)),
+        "--replay-dtype",
+        cfg.get("server.replay_dtype", "float32"),
         "--save-freq",
         str(cfg.get("server.save_frequency", 1000)),
         "--weights-file-name",
         cfg.get("server.weights_file_name", "network_weights.onnx"),
         "--device",
         cfg.get("server.device", "auto"),
+        "--ingest-batch",
+        str(cfg.get("server.ingest_batch", 64)),
+        "--update-every",
+        str(cfg.get("server.update_every", 1)),
+        "--max-pending-updates",
+        str(cfg.get("server.max_pending_updates", 0)),
     ]
+    if cfg.get("server.compile_network", False):
+        cmd.append("--compile-network")
+    if cfg.get("server.quantize_onnx", False):
+        cmd.append("--quantize-onnx")
 
     env = os.environ.copy()
     env["TF_CPP_MIN_LOG_LEVEL"] = "2"
@@ -359,6 +373,11 @@ def wait_for_server_ports(cfg: Config) -> bool:
 
 def _ensure_tmux_session(session_name: str) -> bool:
     """Checks if a tmux session exists, creates it if not."""
+    with _tmux_session_lock:
+        return _ensure_tmux_session_locked(session_name)
+
+
+def _ensure_tmux_session_locked(session_name: str) -> bool:
     try:
         check_cmd = [TMUX_COMMAND, "has-session", "-t", session_name]
         log.debug(f"Checking for tmux session: {shlex.join(check_cmd)}")
@@ -409,9 +428,7 @@ def start_robocode_instance(instance_id: int, cfg: Config, pm: ProcessManager) -
     if not all([robocode_home, maven_project_dir, battle_file]):
         log.error(f"Missing paths for Robocode {instance_id}.")
         return False
-    if not robocode_home.is_dir():
-        log.error(f"Robocode home not found: {robocode_home}")
-        return False
+    # robocode_home is resolved and checked to be a directory by Config.
     if not maven_project_dir.is_dir():
         log.error(f"Maven project dir not found: {maven_project_dir}")
         return False
@@ -423,7 +440,7 @@ def start_robocode_instance(instance_id: int, cfg: Config, pm: ProcessManager) -
     log.warning(
         f"Robocode libs dir not found: {robocode_libs_dir}."
     ) if not robocode_libs_dir.is_dir() else cp_parts.append(
-        str(robocode_libs_dir.resolve() / "*")
+        str(robocode_libs_dir / "*")
     )
     artifact_id = cfg.get("maven.artifact_id", "plato-robot")
     version = cfg.get("maven.version", "1.0-SNAPSHOT")
@@ -451,7 +468,7 @@ def start_robocode_instance(instance_id: int, cfg: Config, pm: ProcessManager) -
         "-Dsun.io.useCanonCaches=false",
         "-Ddebug=true",
         "-DNOSECURITY=true",
-        f"-Drobocode.home={robocode_home.resolve()}",
+        f"-Drobocode.home={robocode_home}",
         "-Dfile.encoding=UTF-8",
     ]
 
@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
-import argparse
+import os
+import select
 import signal
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
 from colorama import Style
 
@@ -12,23 +14,12 @@ try:
     from plato_setup import (
         SCRIPT_NAME,
         SCRIPT_VERSION,
-        Config,
-        ConfigError,
         ProcessManager,
-        check_required_commands,
-        check_robot_compiled,
-        clean_log_directory,
-        compile_robot,
-        generate_battle_file,
         log_debug,
         log_error,
         log_info,
         log_warn,
         setup_logging,
-        start_robocode_instance,
-        start_server,
-        start_tensorboard,
-        wait_for_server_ports,
     )
     from plato_setup.constants import (
         DEFAULT_CONFIG_FILENAME,
@@ -50,23 +41,12 @@ except ImportError as e:
         from plato_setup import (
             SCRIPT_NAME,
             SCRIPT_VERSION,
-            Config,
-            ConfigError,
             ProcessManager,
-            check_required_commands,
-            check_robot_compiled,
-            clean_log_directory,
-            compile_robot,
-            generate_battle_file,
             log_debug,
             log_error,
             log_info,
             log_warn,
             setup_logging,
-            start_robocode_instance,
-            start_server,
-            start_tensorboard,
-            wait_for_server_ports,
         )
         from plato_setup.constants import (
             DEFAULT_CONFIG_FILENAME,
@@ -76,13 +56,28 @@ except ImportError as e:
     else:
         sys.exit(1)
 
+if TYPE_CHECKING:
+    from plato_setup import Config
+
+
+# argparse destinations that control this script rather than override config keys.
+_FLAG_DESTS = frozenset(
+    {"flag_clean_logs", "flag_compile_robot", "flag_tail_logs", "script_log_level"}
+)
 
 pm = ProcessManager()
-cfg: Optional[Config] = None
+cfg: Optional["Config"] = None
 generated_battle_file_to_clean: Optional[Path] = None
 
 
 def parse_arguments():
+    # --help-config needs no parsing at all; answer it before building the parser.
+    if "-H" in sys.argv[1:] or "--help-config" in sys.argv[1:]:
+        print_config_help()
+        sys.exit(0)
+
+    import argparse
+
     parser = argparse.ArgumentParser(
         description=f"{Style.BRIGHT}Plato Robocode RL Training Setup {SCRIPT_VERSION}{Style.RESET_ALL}\n"
         f"Orchestrates the setup for distributed Robocode RL training.",
@@ -262,22 +257,11 @@ def parse_arguments():
 
     args = parser.parse_args()
 
-    if args.help_config:
-        print_config_help()
-        sys.exit(0)
-
-    overrides = {}
-    script_flags = {}
-    for key, value in vars(args).items():
-        if value is not None:
-            if key.startswith("flag_"):
-                script_flags[key] = value
-            elif key == "script_log_level":
-                script_flags[key] = value
-            elif key in ["logging.separate_robot_consoles"]:
-                overrides[key] = value
-            elif "." in key:
-                overrides[key] = value
+    parsed = vars(args)
+    script_flags = {
+        k: v for k, v in parsed.items() if v is not None and k in _FLAG_DESTS
+    }
+    overrides = {k: v for k, v in parsed.items() if v is not None and "." in k}
 
     return args.config, overrides, script_flags
 
@@ -371,6 +355,22 @@ def main():
 
     config_path_arg, overrides, script_flags = parse_arguments()
 
+    # Deferred until after argument parsing so --help/--help-config do not
+    # pay for the YAML and task modules.
+    from plato_setup import (
+        Config,
+        ConfigError,
+        check_required_commands,
+        check_robot_compiled,
+        clean_log_directory,
+        compile_robot,
+        generate_battle_file,
+        start_robocode_instance,
+        start_server,
+        start_tensorboard,
+        wait_for_server_ports,
+    )
+
     script_log_level_flag = script_flags.get("script_log_level")
     temp_log_level = script_log_level_flag if script_log_level_flag else "INFO"
     setup_logging(temp_log_level)
@@ -520,15 +520,21 @@ def main():
         log_info("Initial server wait skipped (delay <= 0 in config or default).")
 
     log_info(f"Starting {cfg.get('robocode.instances', 0)} Robocode instance(s)...")
-    robocode_start_failures = 0
     num_instances = cfg.get("robocode.instances", 0)
-    successful_starts = 0
-    for i in range(1, num_instances + 1):
-        if start_robocode_instance(i, cfg, pm):
-            successful_starts += 1
-        else:
-            robocode_start_failures += 1
-        time.sleep(0.2)
+    executor = ThreadPoolExecutor(max_workers=max(1, min(num_instances, 8)))
+    try:
+        start_results = list(
+            executor.map(
+                lambda i: start_robocode_instance(i, cfg, pm),
+                range(1, num_instances + 1),
+            )
+        )
+    finally:
+        # On a signal, cleanup() has already run; drop the queued starts. The
+        # ones in flight are stopped by the process manager once they start.
+        executor.shutdown(wait=True, cancel_futures=True)
+    successful_starts = sum(start_results)
+    robocode_start_failures = len(start_results) - successful_starts
 
     if robocode_start_failures > 0:
         log_warn(f"{robocode_start_failures} Robocode instance(s) failed to start.")
@@ -542,41 +548,62 @@ def main():
         f"{Style.BRIGHT}>>> Setup complete. Training is running. <<<{Style.RESET_ALL}"
     )
     if use_tmux:
-        log_info(
-            f"Robot consoles running in tmux session: {cfg.get('logging.tmux_session_name', DEFAULT_TMUX_SESSION_NAME)}"
-        )
-        log_info(
-            f"Attach with: tmux attach -t {cfg.get('logging.tmux_session_name', DEFAULT_TMUX_SESSION_NAME)}"
-        )
+        tmux_session = cfg.get("logging.tmux_session_name", DEFAULT_TMUX_SESSION_NAME)
+        log_info(f"Robot consoles running in tmux session: {tmux_session}")
+        log_info(f"Attach with: tmux attach -t {tmux_session}")
     elif not do_tail_logs:
         log_info("Log tailing disabled (--no-tail). Check log files in:")
         log_info(f"  {log_dir}")
     log_warn(">>> Press Ctrl+C to stop all processes. <<<")
     print("---------------------------------")
 
+    # Wake the supervisor loop as soon as any child exits instead of only
+    # polling on a fixed interval. Self-pipe: the interpreter writes the signal
+    # number to wakeup_w and the loop waits in select() on the read end, so the
+    # handler itself does nothing. The timeout still rescans every 5 seconds,
+    # which catches tmux-launched robots whose real process is not our child.
+    wakeup_r = wakeup_w = None
+    prev_sigchld = None
+    if hasattr(signal, "SIGCHLD"):
+        wakeup_r, wakeup_w = os.pipe()
+        os.set_blocking(wakeup_r, False)
+        os.set_blocking(wakeup_w, False)
+        signal.set_wakeup_fd(wakeup_w)
+        prev_sigchld = signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    server_proc = pm.get_process("server")
     try:
         while True:
-            server_proc = pm.get_process("server")
             if server_proc and not server_proc.is_alive():
                 log_error("Python server process terminated unexpectedly. Stopping...")
                 break
 
-            robo_procs_alive = [
-                p
-                for name, p in pm.processes.items()
-                if name.startswith("robocode_") and p.is_alive()
-            ]
+            robo_procs_alive = pm.prune_robocode_processes()
 
             if successful_starts > 0 and not robo_procs_alive:
                 log_warn("All Robocode instances seem to have terminated.")
                 log_error("Assuming unexpected termination of Robocode. Stopping...")
                 break
 
-            time.sleep(5)
+            if wakeup_r is None:
+                time.sleep(5)
+                continue
+            if select.select([wakeup_r], [], [], 5)[0]:
+                try:
+                    while os.read(wakeup_r, 512):
+                        pass
+                except BlockingIOError:
+                    pass
     except KeyboardInterrupt:
         log_debug("KeyboardInterrupt caught in main loop.")
         pass
     finally:
+        if wakeup_r is not None:
+            signal.set_wakeup_fd(-1)
+            if prev_sigchld is not None:
+                signal.signal(signal.SIGCHLD, prev_sigchld)
+            os.close(wakeup_r)
+            os.close(wakeup_w)
         log_info(">>> Main loop exited or interrupted. Initiating final cleanup. <<<")
         cleanup()
 